@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import json, threading, time, argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockOllama:
+    """
+    Enough of the Ollama HTTP API to stream replies, run in a background
+    thread of the benchmark's own process.
+    Replies are `tokens` words long, sent chunk_words at a time at
+    tokens_per_second (0 is as fast as possible) after first_token_delay
+    seconds. Listing the models takes list_latency seconds
+    """
+
+    def __init__(self,
+            tokens:int=200,
+            tokens_per_second:float=0,
+            chunk_words:int=1,
+            first_token_delay:float=0,
+            list_latency:float=0,
+            models:tuple=('mock:latest',),
+            context_length:int=4096,
+            port:int=0) -> None:
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+        self.chunk_words = chunk_words
+        self.first_token_delay = first_token_delay
+        self.list_latency = list_latency
+        self.models = list(models)
+        self.context_length = context_length
+        self.port = port
+        self.server = None
+        self.thread = None
+        # Requests the client hung up on part way through
+        self.disconnects = 0
+
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+
+    def start(self) -> MockOllama:
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                mock.get(self)
+
+            def do_POST(self):
+                mock.post(self)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def send_json(self, handler, data) -> None:
+        body = json.dumps(data).encode()
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+    def get(self, handler) -> None:
+        if handler.path == '/api/tags':
+            time.sleep(self.list_latency)
+            self.send_json(handler, {'models': [
+                {'model': name, 'name': name} for name in self.models
+            ]})
+        elif handler.path == '/api/ps':
+            self.send_json(handler, {'models': []})
+        elif handler.path == '/api/version':
+            self.send_json(handler, {'version': '0.0.0'})
+        else:
+            handler.send_response(404)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+
+
+    def post(self, handler) -> None:
+        length = int(handler.headers.get('Content-Length', 0))
+        request = json.loads(handler.rfile.read(length) or b'{}')
+
+        if handler.path == '/api/show':
+            self.send_json(handler, {
+                'model_info': {'mock.context_length': self.context_length},
+                'parameters': ''
+            })
+        elif handler.path == '/api/chat':
+            self.chat(handler, request)
+        else:
+            handler.send_response(404)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+
+
+    def chat(self, handler, request:dict) -> None:
+        model = request.get('model')
+        done = {
+            'model': model,
+            'message': {'role': 'assistant', 'content': ''},
+            'done': True
+        }
+
+        # An empty chat only loads the model
+        if not request.get('messages'):
+            return self.send_json(handler, done)
+
+        try:
+            time.sleep(self.first_token_delay)
+
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'application/x-ndjson')
+            handler.send_header('Transfer-Encoding', 'chunked')
+            handler.end_headers()
+
+            started = time.monotonic()
+            interval = self.chunk_words / self.tokens_per_second if self.tokens_per_second else 0
+            for sent in range(0, self.tokens, self.chunk_words):
+                words = range(sent, min(sent + self.chunk_words, self.tokens))
+                self.write_chunk(handler, {
+                    'model': model,
+                    'message': {
+                        'role': 'assistant',
+                        'content': ''.join('word%d ' % i for i in words)
+                    },
+                    'done': False
+                })
+                if interval:
+                    time.sleep(interval)
+
+            eval_duration = int((time.monotonic() - started) * 1e9)
+            done.update({
+                'eval_count': self.tokens,
+                'eval_duration': eval_duration,
+                'prompt_eval_count': len(json.dumps(request['messages'])) // 4,
+                'prompt_eval_duration': int(self.first_token_delay * 1e9),
+                'load_duration': 0,
+                'total_duration': eval_duration + int(self.first_token_delay * 1e9)
+            })
+            self.write_chunk(handler, done)
+            handler.wfile.write(b'0\r\n\r\n')
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.disconnects+= 1
+
+
+    def write_chunk(self, handler, data:dict) -> None:
+        line = (json.dumps(data) + '\n').encode()
+        handler.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+        handler.wfile.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake Ollama server')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--tokens-per-second', type=float, default=50)
+    parser.add_argument('--chunk-words', type=int, default=1)
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    parser.add_argument('--list-latency', type=float, default=0)
+    args = parser.parse_args()
+
+    mock = MockOllama(
+        tokens=args.tokens,
+        tokens_per_second=args.tokens_per_second,
+        chunk_words=args.chunk_words,
+        first_token_delay=args.first_token_delay,
+        list_latency=args.list_latency,
+        port=args.port
+    ).start()
+    print('Serving on', mock.url)
+    mock.thread.join()
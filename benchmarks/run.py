@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+"""
+Times the app against MockOllama and writes the results as JSON, e.g.
+
+    python benchmarks/run.py --quick
+    python benchmarks/run.py --compare benchmarks/results/abc1234.json
+
+Qt runs offscreen unless QT_QPA_PLATFORM says otherwise
+"""
+import sys, os, json, time, argparse, tempfile, platform, subprocess
+import copy, gc, statistics, tracemalloc
+from os.path import dirname, abspath, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication
+from ollama_chat.widgets import MainWindow, TextBubble
+from ollama_chat.markdown import render_cache
+from ollama_chat.model import ModelNames, create_client
+from ollama_chat.conversation import Conversation
+from ollama_chat.state import State, JsonStorage
+from ollama_chat.sqlite_storage import SqliteStorage
+from mock_server import MockOllama
+
+
+class TempDirs:
+    """
+    Stands in for AppDirs so nothing touches the real config
+    """
+
+    def __init__(self) -> None:
+        self.root = tempfile.TemporaryDirectory()
+        self.user_config_dir = join(self.root.name, 'config')
+        self.user_data_dir = join(self.root.name, 'data')
+        os.makedirs(self.user_config_dir)
+
+
+def make_settings(**changes) -> dict:
+    settings = copy.deepcopy(State.default_settings)
+    settings['warm_up'] = False
+    settings.update(changes)
+    return settings
+
+
+def make_messages(count:int, words:int=60) -> list:
+    text = ' '.join('word%d' % i for i in range(words))
+    return [
+        {'role': 'user' if i % 2 == 0 else 'assistant', 'content': text}
+        for i in range(count)
+    ]
+
+
+def wait_for(app, condition, timeout:float=60) -> float:
+    """
+    Run the event loop until condition() is true, the seconds it took
+    """
+    started = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError('Benchmark took longer than %ds' % timeout)
+        app.processEvents()
+        time.sleep(0.0005)
+
+    return time.perf_counter() - started
+
+
+def load_models(app, url:str) -> ModelNames:
+    models = ModelNames(create_client(url), True, url)
+    wait_for(app, lambda: models.loaded)
+    return models
+
+
+def rss() -> int:
+    """
+    Resident memory in bytes, 0 where /proc isn't available
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def close_window(app, window) -> None:
+    # close() would ask whether to discard the conversation
+    window.hide()
+    window.deleteLater()
+    app.processEvents()
+    gc.collect()
+
+
+def ask(app, window, conversation) -> float:
+    window.message.setText('Tell me something')
+    started = time.perf_counter()
+    window.ask()
+    wait_for(app, lambda: not conversation.assistant_typing)
+    return time.perf_counter() - started
+
+
+def bench_streaming(app, quick:bool) -> dict:
+    """
+    Words rendered per second through the worker, Conversation.add_word
+    and MainWindow.word_add
+    """
+    tokens = 500 if quick else 3000
+    results = {}
+
+    for engine in ('thread', 'asyncio'):
+        for chunk_words in (1, 8):
+            with MockOllama(tokens=tokens, chunk_words=chunk_words) as mock:
+                models = load_models(app, mock.url)
+                conversation = Conversation(messages=[], model_name='mock:latest')
+                window = MainWindow(
+                    settings=make_settings(engine=engine),
+                    conversation=conversation,
+                    models=models
+                )
+                window.show()
+                wait_for(app, lambda: window.combo_models.isEnabled())
+
+                runs = []
+                for run in range(2 if quick else 3):
+                    elapsed = ask(app, window, conversation)
+                    metrics = conversation.messages[-1].get('metrics', {})
+                    runs.append((elapsed, metrics))
+
+                elapsed = statistics.median(r[0] for r in runs)
+                results['%s chunk_words=%d' % (engine, chunk_words)] = {
+                    'tokens': tokens,
+                    'seconds': round(elapsed, 4),
+                    'tokens_per_second': round(tokens / elapsed, 1),
+                    'ttft': round(statistics.median(
+                        r[1].get('ttft', 0) for r in runs
+                    ), 4),
+                    'first_paint': round(statistics.median(
+                        r[1].get('first_paint', 0) for r in runs
+                    ), 4)
+                }
+                close_window(app, window)
+
+    return results
+
+
+def bench_window_open(app, quick:bool) -> dict:
+    """
+    Opening a MainWindow against the length of its history
+    """
+    sizes = (10, 100, 500) if quick else (10, 100, 500, 2000)
+    results = {}
+
+    with MockOllama() as mock:
+        models = load_models(app, mock.url)
+        for size in sizes:
+            conversation = Conversation(
+                messages=make_messages(size),
+                model_name='mock:latest'
+            )
+
+            started = time.perf_counter()
+            window = MainWindow(
+                settings=make_settings(),
+                conversation=conversation,
+                models=models
+            )
+            window.show()
+            wait_for(app, lambda: window.virtual_view
+                or hasattr(window, 'history_timer'))
+            opened = time.perf_counter() - started
+
+            wait_for(app, lambda: window.virtual_view
+                or not window.history_start)
+            complete = time.perf_counter() - started
+
+            results['messages=%d' % size] = {
+                'virtual_view': window.virtual_view,
+                'open_seconds': round(opened, 4),
+                'all_history_seconds': round(complete, 4)
+            }
+            close_window(app, window)
+
+    return results
+
+
+def bench_state(app, quick:bool) -> dict:
+    """
+    Saving and loading State against the number of conversations,
+    for each storage backend
+    """
+    counts = (10, 100) if quick else (10, 100, 500)
+    backends = {'json': JsonStorage, 'sqlite': SqliteStorage}
+    results = {}
+
+    for backend, storage_class in backends.items():
+        for count in counts:
+            dirs = TempDirs()
+            state = State(storage=storage_class(dirs=dirs))
+            for i in range(count):
+                state.new_conversation().messages.extend(make_messages(20))
+
+            started = time.perf_counter()
+            state.save()
+            saved = time.perf_counter() - started
+
+            started = time.perf_counter()
+            state = State(storage=storage_class(dirs=dirs))
+            loaded = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for conversation in state.conversations:
+                conversation.messages
+            messages = time.perf_counter() - started
+
+            # One new message, the rest is unchanged
+            state.conversations[0].add_user_message('One more')
+            started = time.perf_counter()
+            state.save()
+            saved_one = time.perf_counter() - started
+
+            results['%s conversations=%d' % (backend, count)] = {
+                'save_seconds': round(saved, 4),
+                'load_seconds': round(loaded, 4),
+                'load_messages_seconds': round(messages, 4),
+                'save_one_message_seconds': round(saved_one, 4)
+            }
+            dirs.root.cleanup()
+
+    return results
+
+
+def bench_memory(app, quick:bool) -> dict:
+    """
+    Python memory per streamed message and resident memory per bubble
+    """
+    count = 500 if quick else 2000
+    words = make_messages(1, 60)[0]['content'].split(' ')
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    conversation = Conversation(messages=[], model_name='mock:latest')
+    for i in range(count // 2):
+        conversation.add_user_message('Tell me something')
+        conversation.assistant_typing = True
+        for word in words:
+            conversation.add_word(word + ' ')
+        conversation.assistant_typing = False
+    python_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    with MockOllama() as mock:
+        models = load_models(app, mock.url)
+        size = 200
+        conversation = Conversation(
+            messages=make_messages(size),
+            model_name='mock:latest'
+        )
+        gc.collect()
+        before = rss()
+        window = MainWindow(
+            settings=make_settings(history_initial=size),
+            conversation=conversation,
+            models=models
+        )
+        window.show()
+        wait_for(app, lambda: hasattr(window, 'history_timer'))
+        bubble_bytes = rss() - before
+        close_window(app, window)
+
+    return {
+        'conversation': {
+            'messages': count,
+            'bytes_per_message': python_bytes // count
+        },
+        'bubbles': {
+            'messages': size,
+            'rss_bytes_per_bubble': bubble_bytes // size if bubble_bytes else None
+        }
+    }
+
+
+def bench_stop(app, quick:bool) -> dict:
+    """
+    Time from pressing stop to the request being let go of, while the server
+    is still thinking and while it streams
+    """
+    results = {}
+    for engine in ('thread', 'asyncio'):
+        for case, delay, after in (('before_first_token', 2, 0.2), ('streaming', 0, 0.2)):
+            mock = MockOllama(tokens=2000, tokens_per_second=200, first_token_delay=delay)
+            with mock:
+                models = load_models(app, mock.url)
+                conversation = Conversation(messages=[], model_name='mock:latest')
+                window = MainWindow(
+                    settings=make_settings(engine=engine),
+                    conversation=conversation,
+                    models=models
+                )
+                window.show()
+                wait_for(app, lambda: window.combo_models.isEnabled())
+
+                window.message.setText('Tell me something')
+                window.ask()
+                job = window.ask.thread
+                finished = []
+                job.finished.connect(lambda: finished.append(time.perf_counter()))
+
+                deadline = time.perf_counter() + after
+                wait_for(app, lambda: time.perf_counter() >= deadline)
+
+                started = time.perf_counter()
+                window.ask.stop()
+                ui = time.perf_counter() - started
+                wait_for(app, lambda: finished)
+
+                results['%s %s' % (engine, case)] = {
+                    'ui_seconds': round(ui, 5),
+                    'released_seconds': round(finished[0] - started, 5)
+                }
+                close_window(app, window)
+
+    return results
+
+
+def make_markdown(blocks:int) -> str:
+    block = (
+        '## Heading\n\nSome *words* with `code` and **bold** in them.\n\n'
+        '- one\n- two\n\n```python\nfor i in range(10):\n    print(i)\n```\n\n'
+        '| a | b |\n|---|---|\n| 1 | 2 |\n\n'
+    )
+    return block * blocks
+
+
+def bench_markdown(app, quick:bool) -> dict:
+    """
+    Streaming a Markdown reply into a bubble word by word, and showing
+    it again from history with and without the render cache
+    """
+    sizes = (10, 40) if quick else (10, 40, 160)
+    results = {}
+
+    for size in sizes:
+        text = make_markdown(size)
+        words = text.split(' ')
+        words = [word + ' ' for word in words[:-1]] + words[-1:]
+        result = {'words': len(words)}
+
+        for markdown in (False, True):
+            bubble = TextBubble('', markdown)
+            bubble.resize(600, 100)
+            slowest = 0
+            started = time.perf_counter()
+            for word in words:
+                word_started = time.perf_counter()
+                bubble.append_text(word)
+                slowest = max(slowest, time.perf_counter() - word_started)
+            name = 'markdown' if markdown else 'plain'
+            result[name + '_seconds'] = round(time.perf_counter() - started, 4)
+            result[name + '_slowest_word_ms'] = round(slowest * 1000, 3)
+
+        render_cache.entries.clear()
+        started = time.perf_counter()
+        TextBubble(text, True)
+        result['history_seconds'] = round(time.perf_counter() - started, 4)
+
+        started = time.perf_counter()
+        TextBubble(text, True)
+        result['history_cached_seconds'] = round(time.perf_counter() - started, 4)
+
+        results['blocks=%d' % size] = result
+
+    return results
+
+
+BENCHMARKS = {
+    'streaming': bench_streaming,
+    'window_open': bench_window_open,
+    'state': bench_state,
+    'memory': bench_memory,
+    'stop': bench_stop,
+    'markdown': bench_markdown
+}
+
+
+def git(*args) -> str:
+    try:
+        return subprocess.run(
+            ['git'] + list(args),
+            cwd=ROOT,
+            capture_output=True,
+            text=True
+        ).stdout.strip()
+    except OSError:
+        return ''
+
+
+def flatten(results:dict, prefix:str='') -> dict:
+    flat = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + name + ' / '))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + name] = value
+
+    return flat
+
+
+def compare(old:dict, new:dict) -> None:
+    old = flatten(old['results'])
+    for name, value in flatten(new['results']).items():
+        if name in old and old[name]:
+            print('%-70s %12s %12s %+7.1f%%' % (
+                name, old[name], value, (value - old[name]) / old[name] * 100
+            ))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark ollama-chat')
+    parser.add_argument('--quick', action='store_true', help='Smaller runs')
+    parser.add_argument('--only', help='Comma separated, from: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('--output', help='JSON file, benchmarks/results/<commit>.json by default')
+    parser.add_argument('--compare', help='Earlier results to compare with')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    app = QApplication(sys.argv)
+
+    results = {}
+    for name in names:
+        print('Running', name, file=sys.stderr)
+        results[name] = BENCHMARKS[name](app, args.quick)
+
+    commit = git('rev-parse', '--short', 'HEAD')
+    report = {
+        'commit': commit or None,
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'quick': args.quick,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+
+    output = args.output
+    if not output:
+        output = join(ROOT, 'benchmarks', 'results', (commit or 'unknown') + '.json')
+    os.makedirs(dirname(abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=4)
+
+    print(json.dumps(results, indent=4))
+    print('Written to', output, file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), report)
+
+
+if __name__ == '__main__':
+    main()
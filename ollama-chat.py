@@ -13,14 +13,36 @@
     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
     GNU General Public License for more details.
 """
-import sys, signal
-from ollama_chat import QApplicationOllamaChat
+import sys, signal, time
+
+# For --profile-startup
+started = time.perf_counter()
 
 if __name__ == '__main__':
     # Kill the app on ctrl-c
     signal.signal(signal.SIGINT, signal.SIG_DFL)
 
+    # No windows, so PyQt is never imported
+    if '--batch' in sys.argv:
+        from ollama_chat.batch import main
+        sys.exit(main(sys.argv[1:]))
+
+    if '--storage-stats' in sys.argv:
+        from ollama_chat.archive import main
+        sys.exit(main(sys.argv[1:]))
+
+    from ollama_chat.startup import profile
+    if '--profile-startup' in sys.argv:
+        profile.enable(started)
+
+    with profile.step('Import ollama_chat'):
+        from ollama_chat import QApplicationOllamaChat
+
     app = QApplicationOllamaChat(sys.argv)
-    app.show_conversation_windows()
+    with profile.step('Show windows'):
+        app.show_conversation_windows()
+
+    if profile.enabled:
+        app.profile_startup()
     app.exec_()
     app.save_state()
\ No newline at end of file
@@ -17,81 +17,14 @@
 """
 from __future__ import annotations
 
-from PyQt5.QtWidgets import *
-from PyQt5.QtGui import *
-from PyQt5.QtCore import *
-from .widgets import *
-from .window_mixin import WindowMixin
-#from ollama import chat, list as ai_list, Client
-#import ollama
-import getpass, locale, platform, os
+__all__ = ['QApplicationOllamaChat']
 
-#from .state import State
-from .style import styles
-from .conversation import Conversation
 
-from .state import State
+# PyQt is only imported when the GUI is wanted, so the batch mode
+# and anything else without windows can use the package without it
+def __getattr__(name:str):
+    if name == 'QApplicationOllamaChat':
+        from .app import QApplicationOllamaChat
+        return QApplicationOllamaChat
 
-
-#from .bindings import Bindings
-class QApplicationOllamaChat(QApplication):
-    def __init__(self, argv) -> None:
-        super().__init__(argv)
-        self.state = State()
-        self.conversations = self.state.conversations
-        self.setup_model_client(self.state['url'])
-        self.settings_dialog = self.create_settngs_dialog()
-
-
-    # make this only be created if needed!
-    def create_settngs_dialog(self):
-        dialog = SettingsDialog(self.state)
-        dialog.bind('client_change_request', self.setup_model_client)
-        return dialog
-
-
-    def setup_model_client(self, url:str):
-        self.client = create_client(url)
-        self.models = ModelNames(self.client)
-        for conversation in self.conversations:
-            if conversation.window:
-                conversation.window.models = self.models
-
-
-    def show_conversation_windows(self) -> None:
-        if not len(self.conversations):
-            self.add_new_conversation_window()
-            return
-
-        for conversation in self.conversations:
-            if not conversation.window:
-                self.add_window_to_conversation(conversation)
-
-
-    def add_window_to_conversation(self, conversation:Conversation) -> None:
-        win = MainWindow(
-            settings=self.state,
-            conversation=conversation,
-            models=self.models
-        )
-
-        win.bind('new_window_request', self.add_new_conversation_window)
-        win.bind('settings_show_request', self.settings_dialog.show)
-
-        self.settings_dialog.bind('settings_changed', win.settings_changed)
-
-        win.show()
-        conversation.window = win
-
-
-    def add_new_conversation_window(self) -> None:
-        self.conversations.append(Conversation(
-            messages=[],
-            model_name=self.state.settings['model_name']
-        ))
-
-        self.show_conversation_windows()
-
-
-    def save_state(self) -> None:
-        self.state.save()
\ No newline at end of file
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,222 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+from PyQt5.QtWidgets import *
+from PyQt5.QtGui import *
+from PyQt5.QtCore import *
+from .widgets import *
+from .window_mixin import WindowMixin
+#from ollama import chat, list as ai_list, Client
+#import ollama
+import getpass, locale, platform, os
+
+#from .state import State
+from .clients import clients
+from .style import styles
+from .conversation import Conversation
+
+from .state import State
+from .scheduler import scheduler
+from .hosts import HostPool
+from .startup import profile
+
+
+#from .bindings import Bindings
+class QApplicationOllamaChat(QApplication):
+    def __init__(self, argv) -> None:
+        with profile.step('QApplication'):
+            super().__init__(argv)
+        with profile.step('Settings and conversation index'):
+            self.state = State()
+        self.conversations = self.state.conversations
+        scheduler.max_in_flight = self.state['max_parallel_requests']
+        self.host_monitor = None
+
+        # The windows are shown before there is a client,
+        # connecting waits until the first one has been painted
+        self.models = ModelNames(
+            None,
+            False,
+            self.state['url'],
+            self.state['models_ttl']
+        )
+        self.models.connecting = True
+        self.warmer = Warmer(self.models, self.state)
+        self.first_paint = None
+        # In case no window ever gets painted, e.g. minimised
+        QTimer.singleShot(1000, self.started)
+
+        self.settings_dialog = None
+        self.search_dialog = None
+        self.search_thread = None
+
+
+    def first_window_painted(self) -> None:
+        profile.mark('First window painted')
+        # Once the paint is finished
+        QTimer.singleShot(0, self.started)
+
+
+    def started(self) -> None:
+        if not self.models.connecting:
+            return
+
+        with profile.step('Connect'):
+            self.setup_model_client(self.state['url'])
+        self.rebuild_search()
+
+
+    def show_settings(self) -> None:
+        if not self.settings_dialog:
+            self.settings_dialog = SettingsDialog(self.state)
+            self.settings_dialog.bind('client_change_request', self.setup_model_client)
+            self.settings_dialog.bind('settings_changed', self.settings_changed)
+        self.settings_dialog.show()
+
+
+    def settings_changed(self) -> None:
+        for conversation in self.conversations:
+            if conversation.window:
+                conversation.window.settings_changed()
+
+
+    def rebuild_search(self) -> None:
+        if not self.state.storage.search:
+            return
+
+        self.search_thread = SearchRebuildThread(self.state.storage)
+        self.search_thread.start()
+
+
+    def show_search(self) -> None:
+        if not self.state.storage.search:
+            return
+
+        if not self.search_dialog:
+            self.search_dialog = SearchDialog(self.state.storage.search)
+            self.search_dialog.bind('open_request', self.open_search_result)
+        self.search_dialog.show()
+
+
+    def open_search_result(self, result:dict) -> None:
+        for conversation in self.conversations:
+            if conversation.name == result['conversation']:
+                break
+        else:
+            return
+
+        if not conversation.window:
+            self.add_window_to_conversation(conversation)
+
+        window = conversation.window
+        window.show()
+        window.raise_()
+        window.activateWindow()
+        # After the window has put in its first messages
+        QTimer.singleShot(0, lambda: window.show_message(result['position']))
+
+
+    def setup_model_client(self, url:str):
+        clients.configure(
+            self.state['pool_max_connections'],
+            self.state['pool_max_keepalive']
+        )
+        client = create_client(url)
+        urls = list(dict.fromkeys([url] + self.state['urls']))
+        # Requests still using the old server finish before it is closed
+        clients.retire_except(*urls)
+
+        if self.host_monitor:
+            self.host_monitor.stop()
+            self.host_monitor = None
+
+        hosts = HostPool(urls) if len(urls) > 1 else None
+        # The same ModelNames, every window's model list follows it
+        self.models.set_client(client, url, hosts)
+        self.models.load()
+        self.models.changed.emit()
+
+        if hosts:
+            self.host_monitor = HostMonitor(hosts, self.state['health_interval'])
+            self.host_monitor.probed.connect(self.models.hosts_updated)
+
+
+    def show_conversation_windows(self) -> None:
+        if not len(self.conversations):
+            self.add_new_conversation_window()
+            return
+
+        for conversation in self.conversations:
+            if not conversation.window:
+                self.add_window_to_conversation(conversation)
+
+
+    def add_window_to_conversation(self, conversation:Conversation) -> None:
+        win = MainWindow(
+            settings=self.state,
+            conversation=conversation,
+            models=self.models,
+            warmer=self.warmer
+        )
+
+        win.bind('new_window_request', self.add_new_conversation_window)
+        win.bind('settings_show_request', self.show_settings)
+        win.bind('search_show_request', self.show_search)
+
+        if not self.first_paint:
+            self.first_paint = FirstPaint(win, self.first_window_painted)
+        win.show()
+        conversation.window = win
+
+
+    def add_new_conversation_window(self) -> None:
+        self.state.new_conversation()
+        self.show_conversation_windows()
+
+
+    def profile_startup(self) -> None:
+        """
+        Print the --profile-startup report once the first window has been
+        painted and the model list is in, then quit
+        """
+        reported = []
+
+        def report(name):
+            if reported:
+                return
+            reported.append(name)
+            profile.mark(name)
+            print(profile.report())
+            self.quit()
+
+        self.models.changed.connect(lambda:
+            self.models.loading or report('Model list shown')
+        )
+        QTimer.singleShot(15000, lambda: report('Gave up waiting for models'))
+
+
+    def save_state(self) -> None:
+        search = self.state.storage.search
+        if self.search_thread:
+            search.closed = True
+            self.search_thread.wait()
+
+        self.state.save()
+        if search:
+            search.close()
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import gzip, io, json, os, tempfile, time, argparse
+from os import path
+
+# Optional, gzip is used without it
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Compression => suffix added to the snapshot's file name
+SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+
+
+def compression_to_use(preferred:str) -> str:
+    if preferred == 'zstd' and zstandard is not None:
+        return 'zstd'
+    return 'gzip'
+
+
+def open_archive(file_path:str):
+    """
+    A text file that is decompressed as it is read
+    """
+    if file_path.endswith(SUFFIXES['zstd']):
+        if zstandard is None:
+            raise RuntimeError('zstandard is needed to read ' + file_path)
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'))
+        return io.TextIOWrapper(reader, encoding='utf-8')
+
+    return gzip.open(file_path, 'rt', encoding='utf-8')
+
+
+def read_archive(file_path:str) -> dict:
+    with open_archive(file_path) as file:
+        return json.load(file)
+
+
+def write_archive(file_path:str, data:dict, compression:str) -> None:
+    """
+    Compact JSON, compressed and written atomically like write_file_atomic()
+    """
+    text = json.dumps(data, separators=(',', ':'), sort_keys=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.dirname(file_path),
+        prefix='.' + path.basename(file_path),
+        suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            if compression == 'zstd':
+                tmp.write(zstandard.ZstdCompressor(level=9).compress(text.encode('utf-8')))
+            else:
+                with gzip.GzipFile(fileobj=tmp, mode='wb', mtime=0) as zipped:
+                    zipped.write(text.encode('utf-8'))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, file_path)
+    except Exception:
+        if path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def stats(storage) -> dict:
+    """
+    What archiving has saved in a JsonStorage, on disk and in load time.
+    Every conversation is read, so this is slow
+    """
+    hot = {'count': 0, 'bytes': 0, 'load_seconds': 0.0}
+    archived = {
+        'count': 0,
+        'bytes': 0,
+        # As they would be kept if they weren't archived
+        'json_bytes': 0,
+        'load_seconds': 0.0,
+        'json_load_seconds': 0.0
+    }
+
+    for name in storage.conversation_names():
+        snapshot_path = storage.snapshot_path(name)
+        archive_path = storage.archive_path(name)
+
+        if path.exists(snapshot_path):
+            started = time.perf_counter()
+            with open(snapshot_path) as file:
+                json.load(file)
+            hot['load_seconds']+= time.perf_counter() - started
+            hot['count']+= 1
+            hot['bytes']+= os.stat(snapshot_path).st_size
+        elif archive_path:
+            started = time.perf_counter()
+            data = read_archive(archive_path)
+            archived['load_seconds']+= time.perf_counter() - started
+
+            text = json.dumps(data, indent=4, sort_keys=True)
+            started = time.perf_counter()
+            json.loads(text)
+            archived['json_load_seconds']+= time.perf_counter() - started
+
+            archived['count']+= 1
+            archived['bytes']+= os.stat(archive_path).st_size
+            archived['json_bytes']+= len(text.encode('utf-8'))
+
+    return {
+        'hot': hot,
+        'archived': archived,
+        'saved_bytes': archived['json_bytes'] - archived['bytes']
+    }
+
+
+def megabytes(size:int) -> str:
+    return '%.2f MB' % (size / 1024 / 1024)
+
+
+def main(argv:list) -> int:
+    parser = argparse.ArgumentParser(
+        prog='ollama-chat.py --storage-stats',
+        description='Report the space and load time archiving conversations saves'
+    )
+    parser.add_argument('--storage-stats', action='store_true', required=True)
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    args = parser.parse_args(argv)
+
+    from .state import JsonStorage
+    storage = JsonStorage()
+    results = stats(storage)
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return 0
+
+    hot, archived = results['hot'], results['archived']
+    print('Hot:      %d conversations, %s, loaded in %.1f ms' % (
+        hot['count'],
+        megabytes(hot['bytes']),
+        hot['load_seconds'] * 1000
+    ))
+    print('Archived: %d conversations, %s, %s as JSON' % (
+        archived['count'],
+        megabytes(archived['bytes']),
+        megabytes(archived['json_bytes'])
+    ))
+    if archived['json_bytes']:
+        print('Saved:    %s (%.0f%%)' % (
+            megabytes(results['saved_bytes']),
+            results['saved_bytes'] / archived['json_bytes'] * 100
+        ))
+        print('Loading the archived ones takes %.1f ms, parsing them as JSON %.1f ms' % (
+            archived['load_seconds'] * 1000,
+            archived['json_load_seconds'] * 1000
+        ))
+
+    if isinstance(storage.config, dict) and storage.config.get('storage') == 'sqlite':
+        print('Conversations are kept in SQLite, only JSON storage is archived')
+
+    return 0
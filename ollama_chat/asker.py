@@ -17,7 +17,10 @@
 """
 
 from __future__ import annotations
+from time import monotonic
+from PyQt5.QtCore import Qt, QThread, QTimer
 from .model import AskerAbstract
+from .scheduler import scheduler, PRIORITY_FOCUSED, PRIORITY_NORMAL
 
 
 class Asker(AskerAbstract):
@@ -25,13 +28,25 @@ class Asker(AskerAbstract):
             conversation   : Conversation,
             client_wrapper : client_wrapper,
             context:Optional[str]=None,
+            flush_interval:int=25,
+            flush_chars:int=1024,
+            stable_prompt:bool=True,
+            context_window:Optional[ContextWindow]=None,
+            keep_alive=None,
+            engine:str='thread',
             q_message      : QWidget,
             q_combo_models : QWidget) -> None:
 
         super().__init__(
             conversation=conversation,
             client_wrapper=client_wrapper,
-            context=context
+            context=context,
+            flush_interval=flush_interval,
+            flush_chars=flush_chars,
+            stable_prompt=stable_prompt,
+            context_window=context_window,
+            keep_alive=keep_alive,
+            engine=engine
         )
 
         self.q_message = q_message
@@ -39,15 +54,116 @@ class Asker(AskerAbstract):
 
         self.thread: Optional[QueryThread] = None
 
+        # Stopped threads that haven't finished yet
+        self.stopping = set()
+
+        # When the current question was asked, None once its first word is shown
+        self.asked = None
+
+        # Words the server sent before pausing are shown without waiting
+        # for more to arrive
+        self.flush_timer = QTimer()
+        self.flush_timer.timeout.connect(self.flush_words)
+
+        # Fires once the event loop has had the chance to paint the first word
+        self.first_paint_timer = QTimer()
+        self.first_paint_timer.setSingleShot(True)
+        self.first_paint_timer.setInterval(0)
+        self.first_paint_timer.timeout.connect(self.first_paint)
+
+
+    def flush_words(self) -> None:
+        if self.thread:
+            self.thread.flush_words()
+
 
     def set_assistant_typing(self, value) -> None:
+        if not value:
+            self.first_paint()
         self.conversation.assistant_typing = value
+        if not value:
+            self.flush_timer.stop()
         if not value and self.thread:
             self.thread.quit()
             self.thread.wait()
             self.thread = None
 
 
+    def add_word(self, word:str) -> None:
+        self.conversation.add_word(word)
+
+        if self.asked is not None and not self.first_paint_timer.isActive():
+            self.first_paint_timer.start()
+
+
+    def first_paint(self) -> None:
+        """
+        Record when the first word was shown. Also called as the reply
+        finishes, a reply in one chunk can finish before the timer fires
+        and its metrics can't be added to after that
+        """
+        self.first_paint_timer.stop()
+        if self.asked is None or not self.conversation.messages:
+            return
+        if self.conversation.messages[-1]['role'] != 'assistant':
+            return
+
+        self.conversation.add_metrics(
+            {'first_paint': round(monotonic() - self.asked, 4)}
+        )
+        self.asked = None
+
+
+    def word_error(self, error:str) -> None:
+        self.conversation.bind.trigger('word_error', error)
+
+
+    def queued(self, position:int) -> None:
+        self.conversation.bind.trigger('queued', position)
+
+
+    def context_trimmed(self, messages:int, tokens:int) -> None:
+        self.conversation.bind.trigger('context_trimmed', (messages, tokens))
+
+
+    def stop(self) -> None:
+        if not self.thread:
+            return
+
+        # Not started yet, so it just needs taking out of the queue
+        if scheduler.cancel(self.thread):
+            self.set_assistant_typing(False)
+            return
+
+        thread = self.thread
+        thread.stop = True
+
+        # The answer so far is kept as it is on screen, whatever the thread
+        # still has to say is ignored, so the window is free straight away
+        signals = (
+            thread.word,
+            thread.word_error,
+            thread.typing,
+            thread.trimmed,
+            thread.queued,
+            thread.measured
+        )
+        for signal in signals:
+            signal.disconnect()
+
+        self.stopping.add(thread)
+        thread.finished.connect(lambda: self._stopped(thread))
+        self.thread = None
+        self.flush_timer.stop()
+        self.first_paint()
+        self.conversation.assistant_typing = False
+
+
+    def _stopped(self, thread) -> None:
+        thread.wait()
+        self.stopping.discard(thread)
+
+
     def __call__(self) -> None:
         self.ask()
 
@@ -60,6 +176,10 @@ class Asker(AskerAbstract):
         if self.thread:
             return None
 
+        # Still loading or unable to get the models
+        if not self.q_combo_models.isEnabled():
+            return None
+
         query_text = self._prepair_message(self.q_message.text())
 
         if not query_text:
@@ -69,6 +189,38 @@ class Asker(AskerAbstract):
         self.q_message.setText('')
 
         self._create_thread(self.q_combo_models.currentText())
-        self.thread.word.connect(self.conversation.add_word)
+        self.asked = monotonic()
+        # Words the timer flushes on this thread are queued behind the ones
+        # a QueryThread has sent, an AsyncQueryJob's all go through the
+        # engine's queue already
+        if isinstance(self.thread, QThread):
+            self.thread.word.connect(self.add_word, Qt.QueuedConnection)
+        else:
+            self.thread.word.connect(self.add_word)
+        self.thread.word_error.connect(self.word_error)
         self.thread.typing.connect(self.set_assistant_typing)
-        self.thread.start()
\ No newline at end of file
+        self.thread.trimmed.connect(self.context_trimmed)
+        self.thread.queued.connect(self.queued)
+        self.thread.measured.connect(self.conversation.add_metrics)
+
+        # The bubble is shown while the request waits its turn
+        self.set_assistant_typing(True)
+        if self.flush_interval > 0:
+            self.flush_timer.start(self.flush_interval)
+
+        scheduler.submit(self.thread, self.thread.url, self.priority)
+
+
+    def priority(self) -> int:
+        """
+        The window with the focus goes ahead of the others, asked when the
+        scheduler picks the next request rather than when it was sent
+        """
+        try:
+            if self.q_message.window().isActiveWindow():
+                return PRIORITY_FOCUSED
+        except RuntimeError:
+            # The window has been closed
+            pass
+
+        return PRIORITY_NORMAL
\ No newline at end of file
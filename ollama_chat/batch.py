@@ -0,0 +1,296 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import json, sys, threading, argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+from .query import QueryMixin
+from .context_window import ContextWindow
+from .clients import clients
+from .hosts import HostPool
+from .state import State
+
+# Nothing in here may import PyQt
+
+
+class BatchJob(QueryMixin):
+    """
+    One prompt answered on a worker thread,
+    what QueryThread would signal to the UI is collected instead
+    """
+
+    def __init__(self, record:dict, messages:list, *args, **kwargs) -> None:
+        self.record = record
+        self.words = []
+        self.errors = []
+        self.dropped = (0, 0)
+        self.timings = {}
+        self.setup_query(messages, *args, **kwargs)
+
+
+    def send(self, signal_name:str, *args) -> None:
+        if signal_name == 'word':
+            self.words.append(args[0])
+        elif signal_name == 'word_error':
+            self.errors.append(args[0])
+        elif signal_name == 'trimmed':
+            self.dropped = args
+        elif signal_name == 'measured':
+            self.timings = args[0]
+
+
+    @property
+    def content(self) -> str:
+        return ''.join(self.words)
+
+
+    def result(self) -> dict:
+        result = {
+            'id': self.record.get('id'),
+            'model': self.model_name,
+            'host': self.url,
+            'content': self.content,
+            'metrics': self.timings
+        }
+        if self.errors:
+            result['error'] = self.errors[-1]
+        if self.dropped[0]:
+            result['dropped_messages'] = self.dropped[0]
+
+        return result
+
+
+class Batch:
+    """
+    Runs prompts through the same request building as the chat windows,
+    parallel at a time spread over the servers in urls
+    """
+
+    def __init__(self,
+            state:State,
+            urls:list,
+            parallel:int=4,
+            model_name:Optional[str]=None,
+            save:bool=False) -> None:
+        self.state = state
+        self.settings = state.settings
+        self.url = urls[0]
+        self.parallel = parallel
+        self.model_name = model_name if model_name else self.settings['model_name']
+        self.save = save
+
+        self.lock = threading.Lock()
+        # url => requests running on it
+        self.running = {}
+        self.hosts = HostPool(urls, self.in_flight) if len(urls) > 1 else None
+
+        clients.configure(
+            max(self.settings['pool_max_connections'], parallel),
+            self.settings['pool_max_keepalive']
+        )
+
+
+    def in_flight(self, url:str) -> int:
+        return self.running.get(url, 0)
+
+
+    @staticmethod
+    def messages(record:dict) -> list:
+        if 'invalid' in record:
+            raise ValueError(record['invalid'])
+        if 'messages' in record:
+            return record['messages']
+        if 'prompt' in record:
+            return [{'role': 'user', 'content': record['prompt']}]
+
+        raise ValueError('No "prompt" or "messages"')
+
+
+    def keep_alive(self, model_name:str):
+        keep_alive = self.settings['keep_alive'].get(
+            model_name,
+            self.settings['keep_alive_default']
+        )
+        return keep_alive if keep_alive else None
+
+
+    def create_job(self, record:dict) -> BatchJob:
+        model_name = record.get('model', self.model_name)
+        url = self.hosts.route(model_name) if self.hosts else None
+
+        return BatchJob(
+            record,
+            self.messages(record),
+            clients.get(url if url else self.url),
+            model_name,
+            record.get('context', self.settings['context']),
+            0,
+            self.settings['flush_chars'],
+            self.settings['stable_prompt'],
+            ContextWindow(
+                self.settings['context_length'],
+                self.settings['context_reserve'],
+                self.settings['model_context_lengths']
+            ),
+            self.keep_alive(model_name),
+            url if url else self.url,
+            self.hosts
+        )
+
+
+    def answer(self, record:dict) -> BatchJob:
+        """
+        Runs on a worker thread
+        """
+        job = self.create_job(record)
+        url = job.url
+        with self.lock:
+            self.running[url] = self.running.get(url, 0) + 1
+
+        try:
+            job.stream()
+        finally:
+            with self.lock:
+                self.running[url]-= 1
+
+        return job
+
+
+    def save_job(self, job:BatchJob) -> str:
+        conversation = self.state.new_conversation()
+        conversation.model_name = job.model_name
+        conversation.messages.extend(dict(m) for m in job.messages)
+        conversation.messages.append({
+            'role': 'assistant',
+            'content': job.content,
+            'metrics': job.timings
+        })
+        return conversation.name
+
+
+    def run(self, records:list, output) -> int:
+        """
+        Writes a line to output as each answer finishes, in the order they
+        finish. Returns how many failed
+        """
+        if self.hosts:
+            self.hosts.probe_all()
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            futures = {
+                executor.submit(self.answer, record): record
+                for record in records
+            }
+
+            for future in as_completed(futures):
+                try:
+                    job = future.result()
+                except Exception as e:
+                    output.write(json.dumps({
+                        'id': futures[future].get('id'),
+                        'error': str(e)
+                    }) + '\n')
+                    failed+= 1
+                    continue
+
+                result = job.result()
+                if self.save and not job.errors:
+                    result['conversation'] = self.save_job(job)
+                if self.state.storage.metrics_log and job.timings:
+                    self.state.storage.log_metrics(
+                        result.get('conversation', 'batch'),
+                        job.timings
+                    )
+
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+                failed+= 'error' in result
+
+        if self.save:
+            self.state.save()
+
+        return failed
+
+
+def read_records(lines) -> list:
+    """
+    One JSON object per line, or just a string for a prompt.
+    Lines without an id are numbered from 1, a line that can't be read is
+    kept so that it is reported in the output rather than stopping the batch
+    """
+    records = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            record = {'invalid': 'Invalid JSON: %s' % e}
+
+        if isinstance(record, str):
+            record = {'prompt': record}
+        elif not isinstance(record, dict):
+            record = {'invalid': 'Not a JSON object or string'}
+        record.setdefault('id', number)
+        records.append(record)
+
+    return records
+
+
+def main(argv:list) -> int:
+    parser = argparse.ArgumentParser(
+        prog='ollama-chat.py --batch',
+        description='Answer the prompts in a JSONL file without the GUI'
+    )
+    parser.add_argument('--batch', metavar='INPUT', required=True,
+        help='{"prompt": ...} or {"messages": [...]} per line, - for stdin')
+    parser.add_argument('--output', default='-',
+        help='JSONL of the answers, stdout by default')
+    parser.add_argument('--parallel', type=int, default=4,
+        help='Requests running at once')
+    parser.add_argument('--url', action='append',
+        help='Server to use, can be given more than once')
+    parser.add_argument('--model', help='Model for lines that don\'t name one')
+    parser.add_argument('--save', action='store_true',
+        help='Keep the answers as conversations')
+    args = parser.parse_args(argv)
+
+    state = State()
+    urls = args.url if args.url else [state['url']] + state['urls']
+    batch = Batch(
+        state,
+        list(dict.fromkeys(urls)),
+        max(args.parallel, 1),
+        args.model,
+        args.save
+    )
+
+    if args.batch == '-':
+        records = read_records(sys.stdin)
+    else:
+        with open(args.batch) as file:
+            records = read_records(file)
+
+    if args.output == '-':
+        return 1 if batch.run(records, sys.stdout) else 0
+
+    with open(args.output, 'w') as output:
+        return 1 if batch.run(records, output) else 0
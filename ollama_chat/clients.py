@@ -0,0 +1,242 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import threading, socket
+from contextlib import contextmanager
+
+
+class Abort:
+    """
+    Cuts off the requests a thread makes inside `with abort:` when another
+    thread calls abort().
+    The socket is shut down, so a read that is blocked waiting for the
+    server, e.g. while it loads a model, wakes up at once and the server
+    sees the connection close
+    """
+    local = threading.local()
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.streams = []
+        self.aborted = False
+
+
+    def __enter__(self):
+        Abort.local.current = self
+        return self
+
+
+    def __exit__(self, *exc) -> None:
+        Abort.local.current = None
+        with self.lock:
+            self.streams = []
+
+
+    @staticmethod
+    def current():
+        return getattr(Abort.local, 'current', None)
+
+
+    def trace(self, event:str, info:dict) -> None:
+        # A connection made for this request, before anything is sent
+        if event == 'connection.connect_tcp.complete':
+            self.attach(info.get('return_value'))
+
+
+    def attach(self, stream) -> None:
+        if stream is None:
+            return
+
+        with self.lock:
+            self.streams.append(stream)
+            if self.aborted:
+                self._shutdown(stream)
+
+
+    def abort(self) -> None:
+        with self.lock:
+            self.aborted = True
+            for stream in self.streams:
+                self._shutdown(stream)
+
+
+    def _shutdown(self, stream) -> None:
+        sock = stream.get_extra_info('socket')
+        if sock is None:
+            return
+
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _on_request(request:httpx.Request) -> None:
+    abort = Abort.current()
+    if abort:
+        request.extensions['trace'] = abort.trace
+
+
+def _on_response(response:httpx.Response) -> None:
+    # A reused connection is only known once the headers arrive
+    abort = Abort.current()
+    if abort:
+        abort.attach(response.extensions.get('network_stream'))
+
+
+class ClientRegistry:
+    """
+    One ollama.Client per server URL, each with its own pool of keep-alive
+    connections, shared by every window and worker thread.
+    Clients that are replaced are only closed once no request is using them
+    """
+
+    def __init__(self, max_connections:int=10, max_keepalive:int=5) -> None:
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.streaming = {}
+        self.async_clients = {}
+        # id(AsyncClient) => the event loop it has to be closed on
+        self.loops = {}
+        self.retired = []
+        # id(client) => requests in flight
+        self.users = {}
+
+
+    def _create(self, url:str, streaming:bool=False, asynchronous:bool=False):
+        # Slow to import, so left until the first client is needed
+        import ollama, httpx
+
+        # Stopping cancels the task, so Abort isn't needed
+        if asynchronous:
+            return ollama.AsyncClient(
+                host=url,
+                timeout=httpx.Timeout(10, read=300),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive
+                )
+            )
+
+        return ollama.Client(
+            host=url,
+            # Loading a big model can take a lot longer than connecting
+            timeout=httpx.Timeout(10, read=300),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=0 if streaming else self.max_keepalive
+            ),
+            event_hooks={'request': [_on_request], 'response': [_on_response]}
+        )
+
+
+    def get(self, url:str, streaming:bool=False):
+        """
+        A streaming client opens a new connection for each request,
+        Abort can only find the socket of a connection it saw being made.
+        Keep-alive saves little on a reply that takes seconds anyway
+        """
+        found = self.streaming if streaming else self.clients
+        with self.lock:
+            if url not in found:
+                try:
+                    found[url] = self._create(url, streaming)
+                except Exception:
+                    return None
+
+            return found[url]
+
+
+    def get_async(self, url:str, loop):
+        """
+        An ollama.AsyncClient for the AsyncEngine, only used on loop
+        """
+        with self.lock:
+            if url not in self.async_clients:
+                try:
+                    client = self._create(url, asynchronous=True)
+                except Exception:
+                    return None
+                self.async_clients[url] = client
+                self.loops[id(client)] = loop
+
+            return self.async_clients[url]
+
+
+    def configure(self, max_connections:int, max_keepalive:int) -> None:
+        """
+        Change the pool limits, clients made with the old limits are replaced
+        """
+        if (max_connections, max_keepalive) == (self.max_connections, self.max_keepalive):
+            return
+
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.retire_except(None)
+
+
+    def retire_except(self, *urls) -> None:
+        """
+        Close every client apart from the ones for urls
+        """
+        with self.lock:
+            for found in (self.clients, self.streaming, self.async_clients):
+                for other_url in list(found):
+                    if other_url not in urls:
+                        self.retired.append(found.pop(other_url))
+            self._close_unused()
+
+
+    @contextmanager
+    def using(self, client):
+        """
+        Wrap a request so the client isn't closed part way through it
+        """
+        with self.lock:
+            self.users[id(client)] = self.users.get(id(client), 0) + 1
+        try:
+            yield client
+        finally:
+            with self.lock:
+                self.users[id(client)]-= 1
+                if not self.users[id(client)]:
+                    del self.users[id(client)]
+                self._close_unused()
+
+
+    def _close_unused(self) -> None:
+        for client in list(self.retired):
+            if id(client) not in self.users:
+                self.retired.remove(client)
+                loop = self.loops.pop(id(client), None)
+                try:
+                    if loop:
+                        # close() is a coroutine on an AsyncClient
+                        loop.call_soon_threadsafe(
+                            lambda client=client: loop.create_task(client.close())
+                        )
+                    else:
+                        client.close()
+                except Exception:
+                    pass
+
+
+clients = ClientRegistry()
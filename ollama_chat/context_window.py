@@ -0,0 +1,164 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+# Model name => context length reported by the server
+model_context_lengths = {}
+
+
+def _context_length_from(show_response) -> Optional[int]:
+    length = None
+    for key, value in (show_response.modelinfo or {}).items():
+        if key.endswith('.context_length'):
+            length = int(value)
+
+    return length
+
+
+def server_context_length(client, model_name:str) -> Optional[int]:
+    """
+    The largest context the model supports, asked once per model.
+    Blocking, so only call it from a worker thread
+    """
+    if model_name not in model_context_lengths:
+        try:
+            length = _context_length_from(client.show(model_name))
+        except Exception:
+            length = None
+        model_context_lengths[model_name] = length
+
+    return model_context_lengths[model_name]
+
+
+async def async_server_context_length(client, model_name:str) -> Optional[int]:
+    """
+    server_context_length() for an ollama.AsyncClient
+    """
+    if model_name not in model_context_lengths:
+        try:
+            length = _context_length_from(await client.show(model_name))
+        except Exception:
+            length = None
+        model_context_lengths[model_name] = length
+
+    return model_context_lengths[model_name]
+
+
+class ContextWindow:
+    """
+    Picks the messages of a conversation that fit in the model's context.
+    System and pinned messages are always sent, the rest are filled in from
+    the newest backwards.
+    When the history stops fitting the window jumps forward to low_water of
+    the budget rather than by one message, so the start of the request
+    stays the same for the next few turns. It moves back again if the
+    budget grows
+    """
+    chars_per_token = 4
+    tokens_per_message = 4
+    low_water = 0.75
+
+    def __init__(self,
+            context_length:int=4096,
+            reserve:int=1024,
+            model_lengths:Optional[dict]=None) -> None:
+        self.context_length = context_length
+        self.reserve = reserve
+        self.model_lengths = model_lengths if model_lengths else {}
+
+        # index => (content length, tokens)
+        self.token_cache = {}
+        self.start = 0
+        self.dropped_messages = 0
+        self.dropped_tokens = 0
+
+
+    def estimate(self, message:dict) -> int:
+        return (len(message.get('content') or '') // self.chars_per_token
+            + self.tokens_per_message)
+
+
+    def tokens(self, index:int, message:dict) -> int:
+        size = len(message.get('content') or '')
+        cached = self.token_cache.get(index)
+        if cached and cached[0] == size:
+            return cached[1]
+
+        tokens = self.estimate(message)
+        self.token_cache[index] = (size, tokens)
+        return tokens
+
+
+    def length_for(self, model_name:str, server_length:Optional[int]=None) -> int:
+        length = self.model_lengths.get(model_name, self.context_length)
+        if server_length:
+            length = min(length, server_length)
+
+        return length
+
+
+    def select(self,
+            messages:list,
+            model_name:str='',
+            overhead:int=0,
+            server_length:Optional[int]=None) -> list:
+        """
+        The messages to send, overhead is the tokens used by anything else
+        in the request
+        """
+        budget = self.length_for(model_name, server_length) - self.reserve - overhead
+
+        kept = set()
+        used = 0
+        for i, message in enumerate(messages):
+            if message['role'] == 'system' or message.get('pinned'):
+                kept.add(i)
+                used+= self.tokens(i, message)
+
+        def history_tokens(start):
+            return sum(self.tokens(i, messages[i])
+                for i in range(start, len(messages)) if i not in kept)
+
+        self.start = min(self.start, len(messages))
+        if messages and used + history_tokens(self.start) > budget:
+            # Don't drop the newest message however big it is
+            self.start = len(messages) - 1
+
+        # Fill back up to low_water, after jumping forward or when the budget
+        # has grown, e.g. for a model with a bigger context. Once the history
+        # is over low_water this stops straight away, so the start stays put
+        total = used + history_tokens(self.start)
+        while self.start > 0:
+            i = self.start - 1
+            tokens = 0 if i in kept else self.tokens(i, messages[i])
+            if total + tokens > budget * self.low_water:
+                break
+            total+= tokens
+            self.start = i
+
+        dropped = [i for i in range(self.start) if i not in kept]
+        self.dropped_messages = len(dropped)
+        self.dropped_tokens = sum(self.tokens(i, messages[i]) for i in dropped)
+
+        return [
+            {'role': m['role'], 'content': m['content']}
+            for i, m in enumerate(messages)
+            if i in kept or i >= self.start
+        ]
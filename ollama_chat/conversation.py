@@ -1,31 +1,138 @@
 import uuid
 from .bindings import Bindings
 
+
+class StreamingMessage(dict):
+    """
+    An assistant message that is still being typed.
+    Words are kept in a list and only joined when the content is read,
+    so adding a word doesn't copy the whole reply each time
+    """
+
+    def __init__(self, role='assistant', content=''):
+        super().__init__(role=role, content=content)
+        self.chunks = [content] if content else []
+
+
+    def append(self, word):
+        self.chunks.append(word)
+
+
+    def _join(self):
+        if len(self.chunks) > 1:
+            self.chunks = [''.join(self.chunks)]
+
+        dict.__setitem__(self, 'content', self.chunks[0] if self.chunks else '')
+
+
+    def __getitem__(self, key):
+        if key == 'content':
+            self._join()
+        return super().__getitem__(key)
+
+
+    def __setitem__(self, key, value):
+        if key == 'content':
+            self.chunks = [value] if value else []
+        super().__setitem__(key, value)
+
+
+    # dict() copies a dict subclass's storage directly, skipping
+    # __getitem__, unless __iter__ is overridden. Then it goes through
+    # keys() and __getitem__, which joins the content.
+    # json.dumps() doesn't need this, it calls items()
+    def __iter__(self):
+        return super().__iter__()
+
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+    def items(self):
+        self._join()
+        return super().items()
+
+
+    def values(self):
+        self._join()
+        return super().values()
+
+
+    def copy(self):
+        return dict(self.items())
+
+
+    def freeze(self) -> dict:
+        """
+        Returns a plain dict for when the message is finished
+        """
+        return self.copy()
+
+
 class Conversation:
     def __init__(
             self,
             messages,
             model_name,
-            name=None
+            name=None,
+            loader=None,
+            count=0
         ):
+        # messages can be None with a loader to read them when first needed
+        self._messages = messages
+        self.loader = loader
+        self.count = count
         self.mark_for_deletion = False
-        self.messages = messages
         self.assistant_typing_ = False
         self.bind = Bindings([
             'word_error',
             'add_word',
             'assistant_typing',
-            'add_user_message'
+            'add_user_message',
+            'finish_assistant_message',
+            'context_trimmed',
+            'queued',
+            'discard',
+            'pin'
         ])
         self.model_name = model_name
         self.name = name if name else str(uuid.uuid4())
         self.window = None
 
+    @property
+    def messages(self):
+        if self._messages is None:
+            self._messages = self.loader() if self.loader else []
+        return self._messages
+
+
+    @messages.setter
+    def messages(self, messages):
+        self._messages = messages
+
+
+    def discard(self) -> None:
+        """
+        Throw the conversation away, storage removes it straight away
+        rather than when the program exits
+        """
+        self.mark_for_deletion = True
+        self.bind.trigger('discard')
+
+
+    @property
+    def loaded(self) -> bool:
+        return self._messages is not None
+
+
     def __getattr__(self, method):
         return getattr(self.messages, method)
 
 
     def __len__(self):
+        if not self.loaded:
+            return self.count
         return len(self.messages)
 
 
@@ -37,7 +144,7 @@ class Conversation:
         if not self.messages or self.messages[-1]['role'] != 'assistant':
             self.add_assistant_message()
 
-        self.messages[-1]['content']+= word
+        self.messages[-1].append(word)
         self.bind.trigger('add_word', word)
 
 
@@ -48,7 +155,12 @@ class Conversation:
 
     @assistant_typing.setter
     def assistant_typing(self, value):
+        if value == self.assistant_typing_:
+            return
+
         self.assistant_typing_ = value
+        if not value:
+            self.finish_assistant_message()
         self.bind.trigger('assistant_typing', value)
 
 
@@ -63,7 +175,42 @@ class Conversation:
 
 
     def add_assistant_message(self, content=''):
-        self.messages.append({'role': 'assistant', 'content': content})
+        self.messages.append(StreamingMessage('assistant', content))
+
+
+    def pin(self, index:int, pinned:bool=True) -> None:
+        """
+        Pinned messages are always sent, however long the conversation gets
+        """
+        if pinned:
+            self.messages[index]['pinned'] = True
+        else:
+            self.messages[index].pop('pinned', None)
+
+        self.bind.trigger('pin', index)
+
+
+    def add_metrics(self, metrics:dict) -> None:
+        """
+        Timings of the reply being typed, kept with the message
+        """
+        if (self.assistant_typing and self.messages
+                and self.messages[-1]['role'] == 'assistant'):
+            self.messages[-1].setdefault('metrics', {}).update(metrics)
+
+
+    def finish_assistant_message(self):
+        """
+        Swap the streamed message for a plain dict now it is complete
+        """
+        if self.messages and isinstance(self.messages[-1], StreamingMessage):
+            # Nothing arrived, e.g. the request failed, so there is no reply
+            if not self.messages[-1]['content']:
+                self.messages.pop()
+                return
+
+            self.messages[-1] = self.messages[-1].freeze()
+            self.bind.trigger('finish_assistant_message', self.messages[-1])
 
 
     def __iter__(self):
@@ -0,0 +1,200 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import asyncio, queue, threading
+from typing import Optional
+from PyQt5.QtCore import QObject, pyqtSignal
+from .query import QueryMixin
+from .clients import clients
+from .context_window import async_server_context_length
+
+
+class AsyncQueryJob(QObject, QueryMixin):
+    """
+    Has the same signals and methods as QueryThread,
+    but the reply is streamed by the shared AsyncEngine
+    """
+    word = pyqtSignal(str)
+    typing = pyqtSignal(bool)
+    word_error = pyqtSignal(str)
+    trimmed = pyqtSignal(int, int)
+    queued = pyqtSignal(int)
+    measured = pyqtSignal(dict)
+    # Like QThread.finished
+    finished = pyqtSignal()
+
+    def __init__(self, messages, *args, **kwargs) -> None:
+        super().__init__()
+        self.future = None
+        self.setup_query(messages, *args, **kwargs)
+
+
+    @property
+    def stop(self) -> bool:
+        return self._stop
+
+
+    @stop.setter
+    def stop(self, value:bool) -> None:
+        self._stop = value
+        if value and self.future:
+            get_engine().cancel(self)
+
+
+    def send(self, signal_name:str, *args) -> None:
+        get_engine().events.put((self, signal_name, args))
+        get_engine().bridge.wake()
+
+
+    def start(self) -> None:
+        get_engine().submit(self)
+
+
+    # A QThread has to be joined, there is nothing to do here
+    def quit(self) -> None:
+        pass
+
+
+    def wait(self) -> bool:
+        return True
+
+
+class EngineBridge(QObject):
+    """
+    Lives in the GUI thread and hands the engine's events to the jobs.
+    Only one wake up is pending at a time however many events are queued
+    """
+    woken = pyqtSignal()
+
+    def __init__(self, events:queue.SimpleQueue) -> None:
+        super().__init__()
+        self.events = events
+        self.pending = threading.Event()
+        self.woken.connect(self.drain)
+
+
+    def wake(self) -> None:
+        if not self.pending.is_set():
+            self.pending.set()
+            self.woken.emit()
+
+
+    def drain(self) -> None:
+        self.pending.clear()
+        while True:
+            try:
+                job, signal_name, args = self.events.get_nowait()
+            except queue.Empty:
+                return
+            getattr(job, signal_name).emit(*args)
+
+
+class AsyncEngine:
+    """
+    One asyncio event loop in a background thread streams the replies of
+    every conversation with ollama.AsyncClient.
+    Everything it has to tell the UI goes through one thread safe queue
+    """
+
+    def __init__(self) -> None:
+        self.events = queue.SimpleQueue()
+        self.bridge = EngineBridge(self.events)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+
+    def client(self, url:str):
+        """
+        From the shared registry, so it is replaced and closed along with
+        the other clients when the URL or the pool limits change
+        """
+        return clients.get_async(url, self.loop)
+
+
+    def submit(self, job:AsyncQueryJob) -> None:
+        job.future = asyncio.run_coroutine_threadsafe(self.stream(job), self.loop)
+
+
+    def cancel(self, job:AsyncQueryJob) -> None:
+        self.loop.call_soon_threadsafe(job.future.cancel)
+
+
+    async def stream(self, job:AsyncQueryJob) -> None:
+        job.send('typing', True)
+        buffer = job.create_buffer()
+        job.metrics.start()
+
+        try:
+            while not await self.attempt(job, buffer):
+                pass
+        except asyncio.CancelledError:
+            pass
+        finally:
+            buffer.flush()
+            job.send('measured', job.metrics.finish(job.url))
+            job.send('typing', False)
+            job.send('finished')
+
+
+    async def attempt(self, job:AsyncQueryJob, buffer) -> bool:
+        """
+        Stream from job.url, False when it should be tried again elsewhere
+        """
+        received = False
+        client = self.client(job.url)
+        try:
+            with clients.using(client):
+                server_length = None
+                if job.context_window:
+                    server_length = await async_server_context_length(
+                        client,
+                        job.model_name
+                    )
+
+                query = job.build_query(server_length)
+                if job.replay(query, buffer):
+                    return True
+
+                async for part in await client.chat(**query):
+                    received = True
+                    job.metrics.chunk(part)
+                    job.collect(part)
+                    buffer.add(part['message']['content'])
+                    if job.stop:
+                        break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not received and not job.stop and job.failover(e):
+                return False
+            job.send('word_error', str(e))
+
+        return True
+
+
+engine = None
+
+
+def get_engine() -> AsyncEngine:
+    global engine
+    if engine is None:
+        engine = AsyncEngine()
+
+    return engine
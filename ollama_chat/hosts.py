@@ -0,0 +1,161 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from typing import Optional
+from .clients import clients
+from .scheduler import scheduler
+
+
+class HostStatus:
+    """
+    What the last probe of a server found out.
+    healthy is None until the server has been probed
+    """
+
+    def __init__(self) -> None:
+        self.healthy = None
+        self.models = []
+        self.loaded = set()
+        self.checked = 0.0
+        self.error = None
+
+
+class HostPool:
+    """
+    Several Ollama servers used as one.
+    Each request goes to a healthy server that already has the model loaded,
+    failing that the least busy one that has the model
+    """
+
+    def __init__(self, urls:list, in_flight=None) -> None:
+        self.urls = list(dict.fromkeys(urls))
+        self.status = {url: HostStatus() for url in self.urls}
+        self.lock = threading.Lock()
+
+        # Function of the URL giving the requests running on it
+        self.in_flight = in_flight if in_flight else scheduler.in_flight
+
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+
+    @property
+    def probed(self) -> bool:
+        return any(s.healthy is not None for s in self.status.values())
+
+
+    def probe(self, url:str) -> None:
+        """
+        Ask a server for its models and the ones it has loaded, blocks
+        """
+        client = clients.get(url)
+        try:
+            with clients.using(client):
+                models = [m.model for m in client.list().models]
+                loaded = {m.model for m in client.ps().models}
+        except Exception as e:
+            self.mark_down(url, e)
+            return
+
+        with self.lock:
+            status = self.status[url]
+            status.healthy = True
+            status.models = models
+            status.loaded = loaded
+            status.checked = monotonic()
+            status.error = None
+
+
+    def probe_all(self) -> None:
+        # A server that is down shouldn't hold up the others
+        with ThreadPoolExecutor(max_workers=len(self.urls)) as executor:
+            list(executor.map(self.probe, self.urls))
+
+
+    def mark_down(self, url:str, error=None) -> None:
+        with self.lock:
+            status = self.status[url]
+            status.healthy = False
+            status.loaded = set()
+            status.checked = monotonic()
+            status.error = error
+
+
+    def route(self, model_name:str, exclude=()) -> Optional[str]:
+        """
+        The URL to send a request for model_name to,
+        None if every server is down or excluded
+        """
+        with self.lock:
+            candidates = [url for url in self.urls if url not in exclude
+                and self.status[url].healthy is not False]
+
+            if not candidates:
+                return None
+
+            loaded = [url for url in candidates
+                if model_name in self.status[url].loaded]
+            available = [url for url in candidates
+                if model_name in self.status[url].models]
+
+            url = min(
+                loaded or available or candidates,
+                key=lambda url: self.in_flight(url)
+            )
+
+            # The server loads it to answer, so keep sending it there
+            self.status[url].loaded.add(model_name)
+
+        return url
+
+
+    def model_names(self) -> list:
+        """
+        Every model on a healthy server, in server order
+        """
+        with self.lock:
+            names = {}
+            for url in self.urls:
+                if self.status[url].healthy:
+                    names.update(dict.fromkeys(self.status[url].models))
+
+        return list(names)
+
+
+    def hosts_for(self, model_name:str) -> list:
+        with self.lock:
+            return [url for url in self.urls if self.status[url].healthy
+                and model_name in self.status[url].models]
+
+
+    @property
+    def last_exception(self):
+        """
+        Why nothing can be used, None if at least one server is up
+        """
+        with self.lock:
+            if any(s.healthy for s in self.status.values()):
+                return None
+            errors = [s.error for s in self.status.values() if s.error]
+
+        return errors[0] if errors else None
@@ -0,0 +1,165 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from typing import Optional
+from PyQt5.QtGui import QTextDocument, QTextDocumentFragment, QTextCursor
+
+DIALECT = QTextDocument.MarkdownDialectGitHub
+
+FENCE = re.compile(r' {0,3}(`{3,}|~{3,})')
+# After a blank line these still belong to the block above
+LIST_ITEM = re.compile(r'([-*+]|\d{1,9}[.)])(\s|$)')
+
+
+def render(text:str) -> QTextDocument:
+    document = QTextDocument()
+    document.setMarkdown(text, DIALECT)
+    return document
+
+
+def fragment(text:str, first:bool=True) -> QTextDocumentFragment:
+    """
+    text rendered ready to be inserted at the end of a document.
+    An inserted fragment's first block is merged into the block at the
+    cursor and loses its format, so unless it is the first thing in the
+    document it is rendered after a dummy paragraph and starts with the
+    separator between the two
+    """
+    if first:
+        return QTextDocumentFragment(render(text))
+
+    document = render('.\n\n' + text)
+    block = document.begin()
+    cursor = QTextCursor(document)
+    cursor.setPosition(block.position() + block.length() - 1)
+    cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+    return QTextDocumentFragment(cursor)
+
+
+class BlockSplitter:
+    """
+    Splits Markdown into top level blocks as it streams in.
+    feed() returns the blocks that can't change any more, the rest is the
+    open block in tail. A block ends at the end of a code fence, or at a
+    blank line once the next line shows it doesn't carry on the block
+    """
+
+    def __init__(self) -> None:
+        self.text = ''
+        # Where the open block starts, and how much of it has been read
+        self.start = 0
+        self.scanned = 0
+        # The opening fence of the code block being read
+        self.fence = None
+        # Just after the blank line that may end the open block
+        self.gap = None
+
+
+    @property
+    def tail(self) -> str:
+        return self.text[self.start:]
+
+
+    def feed(self, text:str) -> list:
+        self.text+= text
+        finished = []
+
+        # Only whole lines are read, each of them once
+        while True:
+            end = self.text.find('\n', self.scanned)
+            if end == -1:
+                return finished
+
+            line = self.text[self.scanned:end]
+            self.scanned = end + 1
+            block_end = self._read(line)
+            if block_end is not None and block_end > self.start:
+                finished.append(self.text[self.start:block_end])
+                self.start = block_end
+
+
+    def _read(self, line:str) -> Optional[int]:
+        """
+        Where the open block ends, if line shows that it has
+        """
+        stripped = line.strip()
+
+        if self.fence:
+            if stripped.startswith(self.fence) and not stripped.strip(self.fence[0]):
+                self.fence = None
+                return self.scanned
+            return None
+
+        if not stripped:
+            self.gap = self.scanned
+            return None
+
+        block_end = None
+        if self.gap is not None:
+            if not line[0].isspace() and not LIST_ITEM.match(line):
+                block_end = self.gap
+            self.gap = None
+
+        found = FENCE.match(line)
+        if found:
+            self.fence = found.group(1)
+
+        return block_end
+
+
+class RenderCache:
+    """
+    Rendered messages by their text, so one shown again, e.g. in another
+    window or as older history is loaded, is copied rather than parsed.
+    The most recently used max_entries are kept, only used from the UI thread
+    """
+
+    def __init__(self, max_entries:int=256) -> None:
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+
+    def get(self, text:str) -> Optional[QTextDocumentFragment]:
+        found = self.entries.get(text)
+        if found is not None:
+            self.entries.move_to_end(text)
+        return found
+
+
+    def put(self, text:str, rendered:QTextDocumentFragment) -> None:
+        self.entries[text] = rendered
+        self.entries.move_to_end(text)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+    def fragment(self, text:str) -> QTextDocumentFragment:
+        """
+        text rendered, only parsed if it isn't in the cache
+        """
+        found = self.get(text)
+        if found is None:
+            found = fragment(text)
+            self.put(text, found)
+        return found
+
+
+render_cache = RenderCache()
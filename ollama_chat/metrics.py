@@ -0,0 +1,101 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+from time import monotonic
+from typing import Optional
+
+# Sent by the server in the last chunk of a reply, durations are nanoseconds
+SERVER_STATS = (
+    'eval_count',
+    'eval_duration',
+    'prompt_eval_count',
+    'prompt_eval_duration',
+    'load_duration',
+    'total_duration'
+)
+
+
+class RequestMetrics:
+    """
+    Times one request as its chunks arrive.
+    Client side times are seconds from start()
+    """
+
+    def __init__(self, model_name:str) -> None:
+        self.values = {'model': model_name}
+        self.started = None
+
+
+    def start(self) -> None:
+        # Trying another server doesn't restart the clock
+        if self.started is None:
+            self.started = monotonic()
+
+
+    def chunk(self, part) -> None:
+        if 'ttft' not in self.values and part['message']['content']:
+            self.values['ttft'] = round(monotonic() - self.started, 4)
+
+        if part.get('done'):
+            for name in SERVER_STATS:
+                if part.get(name) is not None:
+                    self.values[name] = part.get(name)
+
+
+    def finish(self, host:Optional[str]=None) -> dict:
+        values = self.values
+        values['host'] = host
+        if self.started is not None:
+            values['total'] = round(monotonic() - self.started, 4)
+
+        if values.get('eval_count') and values.get('eval_duration'):
+            values['tokens_per_second'] = round(
+                values['eval_count'] / values['eval_duration'] * 1e9, 2
+            )
+
+        if values.get('prompt_eval_count') and values.get('prompt_eval_duration'):
+            values['prompt_tokens_per_second'] = round(
+                values['prompt_eval_count'] / values['prompt_eval_duration'] * 1e9, 2
+            )
+
+        return dict(values)
+
+
+def describe(metrics:dict) -> str:
+    """
+    One line summary for under a reply
+    """
+    parts = []
+    if metrics.get('cached'):
+        parts.append('cached')
+    if 'tokens_per_second' in metrics:
+        parts.append('%.1f tokens/s' % metrics['tokens_per_second'])
+    if 'ttft' in metrics:
+        parts.append('first token %.2fs' % metrics['ttft'])
+    if 'first_paint' in metrics:
+        parts.append('shown after %.2fs' % metrics['first_paint'])
+    if 'prompt_eval_count' in metrics:
+        parts.append('prompt %d tokens in %.2fs' % (
+            metrics['prompt_eval_count'],
+            metrics.get('prompt_eval_duration', 0) / 1e9
+        ))
+    if metrics.get('load_duration'):
+        parts.append('load %.2fs' % (metrics['load_duration'] / 1e9))
+
+    return ', '.join(parts)
@@ -17,73 +17,284 @@
 """
 from __future__ import annotations
 
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
 from PyQt5.QtWidgets import QWidget
 from .conversation import Conversation
+from .query import WordBuffer, QueryMixin
+from .context_window import ContextWindow
+from .clients import clients
+from .scheduler import scheduler, PRIORITY_BACKGROUND
+from .hosts import HostPool
 import getpass, locale, platform, os
-import ollama
-from datetime import datetime
+from time import monotonic
 from abc import ABC, abstractmethod
 
 
-class QueryThread(QThread):
+class QueryThread(QThread, QueryMixin):
     word = pyqtSignal(str)
     typing = pyqtSignal(bool)
     word_error = pyqtSignal(str)
+    # Messages and tokens left out to fit the context
+    trimmed = pyqtSignal(int, int)
+    # Place in the Scheduler's queue, 0 once started
+    queued = pyqtSignal(int)
+    # Timings of the reply, see RequestMetrics
+    measured = pyqtSignal(dict)
 
 
-    def __init__(self,
-            messages,
-            client=None,model_name=None,
-            context:Optional[str]=None):
+    def __init__(self, messages, *args, **kwargs):
         super().__init__()
-        self.messages = messages
+        self.setup_query(messages, *args, **kwargs)
+
+
+    def run(self):
+        self.typing.emit(True)
+        self.stream()
+        self.typing.emit(False)
+
+
+class WarmUpThread(QThread):
+    """
+    Loads a model on the server with an empty chat request
+    """
+
+    def __init__(self, client, model_name:str, keep_alive=None) -> None:
+        super().__init__()
+        self.client = client
         self.model_name = model_name
+        self.keep_alive = keep_alive
+
+
+    def run(self):
+        try:
+            with clients.using(self.client):
+                self.client.chat(
+                    model=self.model_name,
+                    messages=[],
+                    keep_alive=self.keep_alive
+                )
+        except Exception:
+            pass
+
+
+class Warmer:
+    """
+    Gets models loaded before the first message is sent to them,
+    so the user doesn't wait for the model to load after pressing send.
+    A model is only warmed once every interval seconds
+    """
+
+    def __init__(self, client_wrapper, settings) -> None:
+        self.client_wrapper = client_wrapper
+        self.settings = settings
+        self.threads = {}
+        self.warmed = {}
+
+
+    def keep_alive(self, model_name:str):
+        keep_alive = self.settings['keep_alive'].get(
+            model_name,
+            self.settings['keep_alive_default']
+        )
+        return keep_alive if keep_alive else None
+
+
+    def warm(self, model_name:str) -> None:
+        if not self.settings['warm_up'] or not model_name:
+            return
+
+        if getattr(self.client_wrapper, 'client', None) is None:
+            return
+
+        if model_name in self.threads:
+            return
+
+        warmed = self.warmed.get(model_name)
+        if warmed and monotonic() - warmed < self.settings['warm_up_interval']:
+            return
+
+        url = self.client_wrapper.route(model_name)
+        thread = WarmUpThread(
+            clients.get(url),
+            model_name,
+            self.keep_alive(model_name)
+        )
+        thread.finished.connect(lambda: self.threads.pop(model_name, None))
+        self.threads[model_name] = thread
+        self.warmed[model_name] = monotonic()
+
+        # Real questions go first
+        scheduler.submit(thread, url, PRIORITY_BACKGROUND)
+
+
+class ModelListThread(QThread):
+    """
+    Asks a server for its models without blocking the UI
+    """
+
+    def __init__(self, client) -> None:
+        super().__init__()
         self.client = client
-        self.stop = False
-        self.context = context
+        self.models = None
+        self.exception = None
 
 
     def run(self):
-        self.stop = False
-        self.typing.emit(True)
+        try:
+            with clients.using(self.client):
+                self.models = [m.model for m in self.client.list().models]
+        except Exception as e:
+            self.exception = e
 
-        messages_context = [
-            {'role': 'system', 'content':
-                "The current date/time is '%s'" % datetime.now()
-            },
-            {'role': 'system', 'content':
-                "The current user's username is '%s'" % getpass.getuser()
-            }
-        ]
-
-        if self.context:
-            messages_context.append({'role': 'system', 'content': self.context})
-
-        query = {
-            'model': self.model_name,
-            'messages': messages_context + self.messages,
-            'stream': True
-        }
-
-        for part in self.client.chat(**query):
-            try:
-                self.word.emit(part['message']['content'])
-            except ResponseError as e:
-                self.word_error.emit(e)
-
-            if self.stop:
-                break
 
-        self.typing.emit(False)
+class MessageLoadThread(QThread):
+    """
+    Reads the messages of a conversation without blocking the UI
+    """
+
+    def __init__(self, loader) -> None:
+        super().__init__()
+        self.loader = loader
+        self.messages = None
+
+
+    def run(self):
+        try:
+            self.messages = self.loader()
+        except Exception:
+            pass
+
+
+class ModelCache(QObject):
+    """
+    The model names of each server URL, shared by every ModelNames so
+    windows and the settings dialog only ask a server once per TTL
+    """
+    updated = pyqtSignal(str)
+
+    def __init__(self) -> None:
+        super().__init__()
+        # url => (loaded at, models, exception)
+        self.entries = {}
+        self.threads = {}
+
+
+    def get(self, url:str):
+        return self.entries.get(url)
+
+
+    def is_fresh(self, url:str, ttl:int) -> bool:
+        entry = self.entries.get(url)
+        return bool(entry) and monotonic() - entry[0] < ttl
+
+
+    def is_fetching(self, url:str) -> bool:
+        return url in self.threads
+
+
+    def fetch(self, url:str, client) -> None:
+        if url in self.threads:
+            return
+
+        thread = ModelListThread(client)
+        thread.finished.connect(lambda: self._fetched(url, thread))
+        self.threads[url] = thread
+        thread.start()
+
+
+    def _fetched(self, url:str, thread:ModelListThread) -> None:
+        del self.threads[url]
+        self.entries[url] = (monotonic(), thread.models, thread.exception)
+        self.updated.emit(url)
+
+
+model_cache = ModelCache()
 
 
-class ModelNames:
-    def __init__(self, client, load=False):
+class HostProbeThread(QThread):
+    def __init__(self, hosts:HostPool) -> None:
+        super().__init__()
+        self.hosts = hosts
+
+
+    def run(self):
+        self.hosts.probe_all()
+
+
+class SearchRebuildThread(QThread):
+    """
+    Brings the search index up to date with the conversation files
+    """
+
+    def __init__(self, storage) -> None:
+        super().__init__()
+        self.storage = storage
+
+
+    def run(self):
+        try:
+            self.storage.search.rebuild(self.storage)
+        except Exception:
+            pass
+
+
+class HostMonitor(QObject):
+    """
+    Probes every server in a HostPool every interval seconds
+    """
+    probed = pyqtSignal()
+
+    def __init__(self, hosts:HostPool, interval:int=15) -> None:
+        super().__init__()
+        self.hosts = hosts
+        self.thread = None
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.probe)
+        self.timer.start(interval * 1000)
+        self.probe()
+
+
+    def probe(self) -> None:
+        if self.thread:
+            return
+
+        self.thread = HostProbeThread(self.hosts)
+        self.thread.finished.connect(self._probed)
+        self.thread.start()
+
+
+    def stop(self) -> None:
+        self.timer.stop()
+
+
+    def _probed(self) -> None:
+        self.thread = None
+        self.probed.emit()
+
+
+class ModelNames(QObject):
+    """
+    The models on a server, loaded in the background.
+    Until the first answer arrives it is empty and loading is True,
+    changed is emitted whenever a new list arrives.
+    With a HostPool it is every model in the pool instead.
+    While connecting is set there is no client yet, see set_client()
+    """
+    changed = pyqtSignal()
+
+    def __init__(self, client, load=False, url=None, ttl:int=60,
+            hosts:Optional[HostPool]=None):
+        super().__init__()
+        self.hosts = hosts
         self.client = client
+        self.url = url
+        self.ttl = ttl
         self.models = None
         self.loaded = False
         self.last_exception = None
+        self.connecting = False
+
+        model_cache.updated.connect(self._cache_updated)
 
         if load:
             self.load()
@@ -117,31 +328,94 @@ class ModelNames:
         return self.models[item]
 
 
+    @property
+    def loading(self) -> bool:
+        if self.connecting:
+            return True
+        if self.hosts:
+            return not self.loaded
+        return not self.loaded and model_cache.is_fetching(self.url)
+
+
     def load(self):
-        if not self.loaded:
-            if self.client is None:
-                self.last_exception = 'No client'
+        """
+        Use what the cache has and refresh it in the background if it is
+        older than the TTL, never blocks
+        """
+        if self.connecting:
+            return
+
+        if self.client is None:
+            self.last_exception = 'No client'
+            self.loaded = True
+            self.models = None
+            return
+
+        # Kept up to date by a HostMonitor
+        if self.hosts:
+            if self.hosts.probed:
+                self.models = self.hosts.model_names()
+                self.last_exception = self.hosts.last_exception
                 self.loaded = True
-                self.models = None
-                return
+            return
 
-            self.last_exception = None
-            try:
-                # blocking if there is no connection!
-                self.models = [m.model for m in self.client.list().models]
-            except Exception as e:
-                self.models = None
-                self.loaded = True
-                self.last_exception = e
-                return
+        if not self.loaded and model_cache.get(self.url):
+            self._use(model_cache.get(self.url))
 
-        self.loaded = True
-        self.last_exception = None
+        if not model_cache.is_fresh(self.url, self.ttl):
+            model_cache.fetch(self.url, self.client)
 
 
     def reload(self):
         self.loaded = False
+        self.models = None
+        self.last_exception = None
+        model_cache.entries.pop(self.url, None)
+        self.load()
+
+
+    def route(self, model_name:str) -> str:
+        """
+        The URL of the server to ask model_name
+        """
+        if self.hosts:
+            url = self.hosts.route(model_name)
+            if url:
+                return url
+
+        return self.url
+
+
+    def hosts_for(self, model_name:str) -> list:
+        if self.hosts:
+            return self.hosts.hosts_for(model_name)
+        return [self.url]
+
+
+    def hosts_updated(self) -> None:
         self.load()
+        self.changed.emit()
+
+
+    def set_client(self, client, url:str, hosts:Optional[HostPool]=None) -> None:
+        self.client = client
+        self.url = url
+        self.hosts = hosts
+        self.connecting = False
+        self.loaded = False
+        self.models = None
+        self.last_exception = None
+
+
+    def _use(self, entry) -> None:
+        loaded_at, self.models, self.last_exception = entry
+        self.loaded = True
+
+
+    def _cache_updated(self, url:str) -> None:
+        if url == self.url:
+            self._use(model_cache.get(url))
+            self.changed.emit()
 
 
 
@@ -154,11 +428,28 @@ class AskerAbstract(ABC):
     def __init__(self, *,
             conversation : Conversation,
             client_wrapper,
-            context:Optional[str]=None) -> None: # add in a type
+            context:Optional[str]=None,
+            flush_interval:int=25,
+            flush_chars:int=1024,
+            stable_prompt:bool=True,
+            context_window:Optional[ContextWindow]=None,
+            keep_alive=None,
+            engine:str='thread') -> None: # add in a type
 
         self.conversation = conversation
         self.client_wrapper = client_wrapper
         self.context = context
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self.stable_prompt = stable_prompt
+        self.context_window = context_window
+
+        # A function of the model name
+        self.keep_alive = keep_alive
+
+        # "thread" for a QueryThread per request,
+        # "asyncio" to share one event loop between every conversation
+        self.engine = engine
 
         # If self.thread is None, then we are NOT tyring a reply from the AI
         self.thread: Optional[QueryThread] = None
@@ -173,14 +464,28 @@ class AskerAbstract(ABC):
 
     def _create_thread(self, model_name) -> None:
         """
-        Create a new QueryThread() in self.thread
+        Create a new QueryThread() in self.thread,
+        or an AsyncQueryJob() which works the same way
         """
+        query_class = QueryThread
+        if self.engine == 'asyncio':
+            from .engine import AsyncQueryJob
+            query_class = AsyncQueryJob
+
+        url = self.client_wrapper.route(model_name)
 
-        self.thread = QueryThread(
+        self.thread = query_class(
             self.conversation.messages,
-            self.client_wrapper.client,
+            clients.get(url),
             model_name,
-            self.context
+            self.context,
+            self.flush_interval,
+            self.flush_chars,
+            self.stable_prompt,
+            self.context_window,
+            self.keep_alive(model_name) if self.keep_alive else None,
+            url,
+            self.client_wrapper.hosts
         )
 
 
@@ -193,7 +498,7 @@ class AskerAbstract(ABC):
 
 
 def create_client(url):
-    try:
-        return ollama.Client(host=url, timeout=10)
-    except Exception:
-        return None
\ No newline at end of file
+    """
+    The shared client for url, see ClientRegistry
+    """
+    return clients.get(url)
@@ -0,0 +1,81 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import getpass
+from datetime import datetime
+from typing import Optional
+
+
+# Lines that change from one request to the next by themselves
+VOLATILE_PREFIXES = (
+    "The current date/time is",
+    "The current date is",
+    "The current time is"
+)
+
+
+def system_message(content:str) -> dict:
+    return {'role': 'system', 'content': content}
+
+
+def is_volatile(message:dict) -> bool:
+    return (message.get('role') == 'system'
+        and message.get('content', '').startswith(VOLATILE_PREFIXES))
+
+
+def build_messages(
+        messages:list,
+        context:Optional[str]=None,
+        stable:bool=True,
+        now:Optional[datetime]=None,
+        username:Optional[str]=None) -> list:
+    """
+    The full list of messages to send for a conversation.
+
+    When stable is set everything in front of the history only changes once
+    a day and the exact time goes after the history. Each request then
+    starts with the same bytes as the one before it, so the server can
+    reuse what it already evaluated instead of reading the whole
+    conversation again
+    """
+    now = now if now else datetime.now()
+    username = username if username else getpass.getuser()
+
+    if not stable:
+        before = [
+            system_message("The current date/time is '%s'" % now),
+            system_message("The current user's username is '%s'" % username)
+        ]
+        if context:
+            before.append(system_message(context))
+
+        return before + messages
+
+    before = [system_message("The current user's username is '%s'" % username)]
+    if context:
+        before.append(system_message(context))
+    before.append(system_message(
+        "The current date is '%s'" % now.strftime('%Y-%m-%d')
+    ))
+
+    after = [system_message(
+        "The current time is '%s'" % now.strftime('%H:%M')
+    )]
+
+    return before + messages + after
@@ -0,0 +1,320 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import threading
+from time import monotonic
+from typing import Optional
+from .prompt import build_messages
+from .context_window import ContextWindow, server_context_length
+from .clients import clients, Abort
+from .hosts import HostPool
+from .metrics import RequestMetrics
+from .response_cache import response_cache, cache_key
+
+
+class WordBuffer:
+    """
+    Holds on to streamed words so that they are passed on at most once every
+    interval milliseconds, or sooner if max_chars have built up.
+    An interval of 0 passes every word straight through.
+    Words left over when the server pauses wait for flush_if_due(), which
+    the UI calls from a timer while the worker thread is still adding.
+    Every method takes lock and emits while holding it, that is what keeps
+    the two threads from losing words or sending them out of order
+    """
+
+    def __init__(self, emit, interval:int=25, max_chars:int=1024) -> None:
+        self.emit = emit
+        self.interval = interval / 1000
+        self.max_chars = max_chars
+        self.words = []
+        self.size = 0
+        self.last_flush = 0.0
+        self.lock = threading.Lock()
+
+
+    def add(self, word:str) -> None:
+        if not word:
+            return
+
+        with self.lock:
+            self.words.append(word)
+            self.size+= len(word)
+
+            if (self.interval <= 0
+                    or self.size >= self.max_chars
+                    or monotonic() - self.last_flush >= self.interval):
+                self._flush()
+
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+
+    def flush_if_due(self) -> None:
+        with self.lock:
+            if self.words and monotonic() - self.last_flush >= self.interval:
+                self._flush()
+
+
+    def _flush(self) -> None:
+        # Emitted under the lock so the words can't overtake each other
+        if self.words:
+            self.emit(''.join(self.words))
+            self.words = []
+            self.size = 0
+
+        self.last_flush = monotonic()
+
+
+class QueryMixin:
+    """
+    Builds the chat request for a conversation,
+    shared by QueryThread and the asyncio engine's AsyncQueryJob
+    """
+
+    def setup_query(self,
+            messages,
+            client=None,model_name=None,
+            context:Optional[str]=None,
+            flush_interval:int=25,
+            flush_chars:int=1024,
+            stable_prompt:bool=True,
+            context_window:Optional[ContextWindow]=None,
+            keep_alive=None,
+            url:Optional[str]=None,
+            hosts:Optional[HostPool]=None):
+        self.abort = Abort()
+        self.messages = messages
+        self.model_name = model_name
+        self.client = client
+        self.stop = False
+        self.context = context
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self.stable_prompt = stable_prompt
+        self.context_window = context_window
+        self.keep_alive = keep_alive
+        self.url = url
+        self.hosts = hosts
+        self.tried = set()
+        self.metrics = RequestMetrics(model_name)
+        # Set while the reply is being collected for the response cache
+        self.cache_key = None
+        self.reply = []
+        # The WordBuffer of the reply being streamed
+        self.buffer = None
+
+
+    def failover(self, error) -> bool:
+        """
+        Move the request on to another server in the pool, only safe to
+        do before anything has been received
+        """
+        if not self.hosts or not self.url:
+            return False
+
+        import ollama
+
+        # A server that answers with an error is still up
+        if not isinstance(error, ollama.ResponseError):
+            self.hosts.mark_down(self.url, error)
+
+        self.tried.add(self.url)
+        url = self.hosts.route(self.model_name, self.tried)
+        if url is None:
+            return False
+
+        self.url = url
+        self.client = clients.get(url)
+        return True
+
+
+    @property
+    def stop(self) -> bool:
+        return self.abort.aborted
+
+
+    @stop.setter
+    def stop(self, value:bool) -> None:
+        # Closes the connection rather than waiting for the next chunk
+        if value:
+            self.abort.abort()
+
+
+    def send(self, signal_name:str, *args) -> None:
+        getattr(self, signal_name).emit(*args)
+
+
+    def create_buffer(self) -> WordBuffer:
+        # Words are batched up so a fast model doesn't flood the event loop
+        self.buffer = WordBuffer(
+            lambda words: self.send('word', words),
+            self.flush_interval,
+            self.flush_chars
+        )
+        return self.buffer
+
+
+    def flush_words(self) -> None:
+        """
+        Pass on words that have waited the flush interval, called from the
+        UI's timer so they don't wait for the server to send more
+        """
+        if self.buffer:
+            self.buffer.flush_if_due()
+
+
+    def build_query(self, server_length:Optional[int]=None) -> dict:
+        query = {
+            'model': self.model_name,
+            'messages': build_messages(
+                self.fit_messages(server_length),
+                self.context,
+                self.stable_prompt
+            ),
+            'stream': True
+        }
+
+        if self.keep_alive:
+            query['keep_alive'] = self.keep_alive
+
+        if self.context_window and self.model_name in self.context_window.model_lengths:
+            query['options'] = {
+                'num_ctx': self.context_window.model_lengths[self.model_name]
+            }
+
+        return query
+
+
+    def fit_messages(self, server_length:Optional[int]=None) -> list:
+        """
+        The part of the conversation that fits in the model's context
+        """
+        if not self.context_window:
+            # Only what the API knows about, not pinned, metrics etc
+            return [
+                {'role': m['role'], 'content': m['content']}
+                for m in self.messages
+            ]
+
+        overhead = sum(self.context_window.estimate(m) for m in
+            build_messages([], self.context, self.stable_prompt))
+
+        messages = self.context_window.select(
+            self.messages,
+            self.model_name,
+            overhead,
+            server_length
+        )
+        self.send(
+            'trimmed',
+            self.context_window.dropped_messages,
+            self.context_window.dropped_tokens
+        )
+
+        return messages
+
+
+    def replay(self, query:dict, buffer:WordBuffer) -> bool:
+        """
+        Send the reply from the response cache instead of asking the server,
+        False if it doesn't have one
+        """
+        self.cache_key = None
+        self.reply = []
+        if not response_cache.enabled:
+            return False
+
+        self.cache_key = cache_key(query)
+        entry = response_cache.get(self.cache_key)
+        if entry is None:
+            return False
+
+        part = {'message': {'content': entry['content']}, 'done': True}
+        self.metrics.chunk(part)
+        self.metrics.values['cached'] = True
+        buffer.add(entry['content'])
+        return True
+
+
+    def collect(self, part) -> None:
+        """
+        Collect the reply for the response cache, only a complete one is kept
+        """
+        if not self.cache_key:
+            return
+
+        self.reply.append(part['message']['content'])
+        if part.get('done') and not self.stop:
+            response_cache.put(self.cache_key, {
+                'model': self.model_name,
+                'content': ''.join(self.reply)
+            })
+
+
+    def stream_client(self):
+        """
+        A client stop() can cut off before the server starts answering
+        """
+        if not self.url:
+            return self.client
+        return clients.get(self.url, True) or self.client
+
+
+    def stream(self) -> None:
+        """
+        Stream the reply on this thread, a request that fails before
+        anything arrives is tried on the other servers of the pool
+        """
+        buffer = self.create_buffer()
+        self.metrics.start()
+
+        while True:
+            received = False
+            try:
+                server_length = None
+                if self.context_window:
+                    server_length = server_context_length(self.client, self.model_name)
+
+                query = self.build_query(server_length)
+                if self.stop or self.replay(query, buffer):
+                    break
+
+                client = self.stream_client()
+                with self.abort, clients.using(client):
+                    for part in client.chat(**query):
+                        received = True
+                        self.metrics.chunk(part)
+                        self.collect(part)
+                        buffer.add(part['message']['content'])
+
+                        if self.stop:
+                            break
+            except Exception as e:
+                if self.stop:
+                    break
+                if not received and self.failover(e):
+                    continue
+                self.send('word_error', str(e))
+            break
+
+        buffer.flush()
+        self.send('measured', self.metrics.finish(self.url))
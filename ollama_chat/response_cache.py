@@ -0,0 +1,173 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import json, os, threading, hashlib
+from collections import OrderedDict
+from os.path import join
+from typing import Optional
+from .prompt import is_volatile
+
+
+def cache_key(query:dict) -> str:
+    """
+    Hash of what decides the reply: the model, its options and the
+    messages, apart from the date and time lines
+    """
+    payload = {
+        'model': query['model'],
+        'options': query.get('options', {}),
+        'messages': [
+            {'role': m['role'], 'content': m['content']}
+            for m in query['messages'] if not is_volatile(m)
+        ]
+    }
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Finished replies by cache_key(), the most recently used max_entries
+    are kept in memory and up to max_bytes of them in directory.
+    Off until configure() turns it on, used from worker threads
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.max_entries = 128
+        self.directory = None
+        self.max_bytes = 50 * 1024 * 1024
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Worked out the first time something is written
+        self.disk_bytes = None
+
+
+    def configure(self,
+            enabled:bool,
+            max_entries:int=128,
+            directory:Optional[str]=None,
+            max_bytes:int=50 * 1024 * 1024) -> None:
+        with self.lock:
+            self.enabled = enabled
+            self.max_entries = max_entries
+            self.directory = directory
+            self.max_bytes = max_bytes
+            self.disk_bytes = None
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+    def get(self, key:str) -> Optional[dict]:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        entry = self._read(key)
+        if entry:
+            with self.lock:
+                self._remember(key, entry)
+
+        return entry
+
+
+    def put(self, key:str, entry:dict) -> None:
+        with self.lock:
+            self._remember(key, entry)
+
+        if self.directory:
+            self._write(key, entry)
+
+
+    def _remember(self, key:str, entry:dict) -> None:
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+    def _path(self, key:str) -> str:
+        return join(self.directory, key + '.json')
+
+
+    def _read(self, key:str) -> Optional[dict]:
+        if not self.directory:
+            return None
+
+        try:
+            with open(self._path(key)) as file:
+                entry = json.load(file)
+            # The modified time is when it was last used
+            os.utime(self._path(key))
+        except (OSError, ValueError):
+            return None
+
+        return entry
+
+
+    def _write(self, key:str, entry:dict) -> None:
+        text = json.dumps(entry)
+        tmp_path = self._path(key) + '.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w') as file:
+                file.write(text)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            return
+
+        with self.lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(size for path, size, mtime in self._files())
+            else:
+                self.disk_bytes+= len(text)
+
+            if self.disk_bytes > self.max_bytes:
+                self._trim()
+
+
+    def _files(self) -> list:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+
+        return files
+
+
+    def _trim(self) -> None:
+        """
+        Remove the least recently used files until there is some room
+        """
+        files = sorted(self._files(), key=lambda file: file[2])
+        self.disk_bytes = sum(size for path, size, mtime in files)
+
+        for file_path, size, mtime in files:
+            if self.disk_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(file_path)
+                self.disk_bytes-= size
+            except OSError:
+                pass
+
+
+response_cache = ResponseCache()
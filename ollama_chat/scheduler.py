@@ -0,0 +1,119 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import itertools
+
+# Lower goes first
+PRIORITY_FOCUSED = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+
+class Scheduler:
+    """
+    Limits how many requests are sent to each server at once, past that the
+    server only queues them itself while our timeouts run down.
+    Jobs are anything with start(), a finished signal and optionally a
+    queued signal which is given the job's place in the queue, 0 once the
+    job has started.
+    A priority can be a function, it is asked each time the queue is
+    ordered so it can change while the job waits, e.g. with the focus.
+    Only use it from the GUI thread
+    """
+
+    def __init__(self, max_in_flight:int=2) -> None:
+        self.max_in_flight = max_in_flight
+        # url => [(priority, order, job)]
+        self.queues = {}
+        self.running = {}
+        self.order = itertools.count()
+
+
+    def submit(self, job, url:str, priority=PRIORITY_NORMAL) -> None:
+        job.finished.connect(lambda: self._finished(job, url))
+        self.queues.setdefault(url, []).append((priority, next(self.order), job))
+        self._start_next(url)
+
+
+    def cancel(self, job) -> bool:
+        """
+        Take a job out of the queue, False if it has already started
+        """
+        for url, queue in self.queues.items():
+            for entry in queue:
+                if entry[2] is job:
+                    queue.remove(entry)
+                    self._report(url)
+                    return True
+
+        return False
+
+
+    def position(self, job) -> int:
+        for queue in self.queues.values():
+            for position, entry in enumerate(self._ordered(queue), 1):
+                if entry[2] is job:
+                    return position
+
+        return 0
+
+
+    def in_flight(self, url:str) -> int:
+        return len(self.running.get(url, []))
+
+
+    def _finished(self, job, url:str) -> None:
+        running = self.running.get(url, [])
+        if job in running:
+            running.remove(job)
+        self._start_next(url)
+
+
+    def _start_next(self, url:str) -> None:
+        queue = self.queues.get(url, [])
+        running = self.running.setdefault(url, [])
+
+        while queue and len(running) < self.max_in_flight:
+            entry = self._ordered(queue)[0]
+            queue.remove(entry)
+            job = entry[2]
+            running.append(job)
+            if hasattr(job, 'queued'):
+                job.queued.emit(0)
+            job.start()
+
+        self._report(url)
+
+
+    @staticmethod
+    def _ordered(queue:list) -> list:
+        # Only a handful of jobs wait at once, so it is sorted every time
+        return sorted(queue, key=lambda entry: (
+            entry[0]() if callable(entry[0]) else entry[0],
+            entry[1]
+        ))
+
+
+    def _report(self, url:str) -> None:
+        for position, entry in enumerate(self._ordered(self.queues.get(url, [])), 1):
+            if hasattr(entry[2], 'queued'):
+                entry[2].queued.emit(position)
+
+
+scheduler = Scheduler()
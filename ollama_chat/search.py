@@ -0,0 +1,227 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import json, re, sqlite3, threading
+from typing import Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message (
+    id INTEGER PRIMARY KEY,
+    conversation TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    role TEXT,
+    content TEXT,
+    UNIQUE (conversation, position)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS message_text USING fts5(
+    content,
+    content='message',
+    content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS message_added AFTER INSERT ON message BEGIN
+    INSERT INTO message_text (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS message_removed AFTER DELETE ON message BEGIN
+    INSERT INTO message_text (message_text, rowid, content)
+        VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS message_changed AFTER UPDATE ON message BEGIN
+    INSERT INTO message_text (message_text, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    INSERT INTO message_text (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TABLE IF NOT EXISTS conversation (
+    name TEXT PRIMARY KEY,
+    stamp TEXT
+);
+"""
+
+UPSERT = (
+    'INSERT INTO message (conversation, position, role, content)'
+    ' VALUES (?, ?, ?, ?)'
+    ' ON CONFLICT (conversation, position) DO UPDATE'
+    ' SET role = excluded.role, content = excluded.content'
+)
+
+# Marks the matches in a snippet, they can't turn up in a message
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+
+def match_query(text:str) -> Optional[str]:
+    """
+    Every word typed has to be found, the last one can be the start of a
+    word once it is long enough not to match half the index.
+    Quoting them stops FTS5 reading the user's text as its own syntax
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+
+    query = ' '.join('"%s"' % word for word in words)
+    if len(words[-1]) >= 3:
+        query+= '*'
+
+    return query
+
+
+class SearchIndex:
+    """
+    A full-text index of the messages of every conversation in SQLite.
+    Messages are added as they are written, rebuild() catches up with
+    conversations that changed while it wasn't looking.
+    One connection shared by the UI and the rebuild thread
+    """
+
+    def __init__(self, file_path:str) -> None:
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.closed = False
+        self.db = sqlite3.connect(file_path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+
+    def add(self, name:str, position:int, message:dict) -> None:
+        with self.lock, self.db:
+            self.db.execute(
+                UPSERT,
+                (name, position, message['role'], message['content'])
+            )
+
+
+    def index_conversation(self, name:str, messages:list, stamp) -> None:
+        """
+        Bring what is indexed for the conversation name in line with
+        messages, only the messages that have changed are written
+        """
+        with self.lock:
+            indexed = dict(self.db.execute(
+                'SELECT position, content FROM message WHERE conversation = ?',
+                (name,)
+            ))
+
+        rows = [
+            (name, position, m['role'], m['content'])
+            for position, m in enumerate(messages)
+            if indexed.get(position) != m['content']
+        ]
+        with self.lock, self.db:
+            self.db.execute(
+                'DELETE FROM message WHERE conversation = ? AND position >= ?',
+                (name, len(messages))
+            )
+            self.db.executemany(UPSERT, rows)
+            self.db.execute(
+                'INSERT OR REPLACE INTO conversation (name, stamp) VALUES (?, ?)',
+                (name, json.dumps(stamp))
+            )
+
+
+    def remove(self, name:str) -> None:
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM message WHERE conversation = ?', (name,))
+            self.db.execute('DELETE FROM conversation WHERE name = ?', (name,))
+
+
+    def saved(self, name:str, stamp) -> None:
+        """
+        The conversation name was saved by us, add() has already indexed
+        what is in it
+        """
+        with self.lock, self.db:
+            self.db.execute(
+                'UPDATE conversation SET stamp = ? WHERE name = ?',
+                (json.dumps(stamp), name)
+            )
+
+
+    def indexed(self) -> dict:
+        """
+        name => Storage.stamp() when the conversation was indexed
+        """
+        with self.lock:
+            rows = self.db.execute('SELECT name, stamp FROM conversation')
+            return {name: json.loads(stamp) for name, stamp in rows}
+
+
+    def search(self, text:str, limit:int=50) -> list:
+        """
+        The best matches first, snippets have the matched words between
+        MATCH_START and MATCH_END
+        """
+        query = match_query(text)
+        if not query:
+            return []
+
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT m.conversation, m.position, m.role,'
+                ' snippet(message_text, 0, ?, ?, ?, 16)'
+                ' FROM message_text JOIN message m ON m.id = message_text.rowid'
+                ' WHERE message_text MATCH ? ORDER BY rank LIMIT ?',
+                (MATCH_START, MATCH_END, '…', query, limit)
+            ).fetchall()
+
+        return [
+            {
+                'conversation': name,
+                'position': position,
+                'role': role,
+                'snippet': snippet
+            }
+            for name, position, role, snippet in rows
+        ]
+
+
+    def rebuild(self, storage) -> int:
+        """
+        Index the conversations that have changed in storage since they
+        were last indexed and forget the ones that are gone.
+        Slow, meant for a background thread, returns how many were indexed
+        """
+        indexed = self.indexed()
+        names = storage.conversation_names()
+        count = 0
+
+        for name in names:
+            if self.closed:
+                return count
+
+            stamp = storage.stamp(name)
+            if indexed.get(name) == stamp:
+                continue
+
+            data = storage.load_conversation(name)
+            if data:
+                self.index_conversation(name, data['messages'], stamp)
+                count+= 1
+
+        for name in set(indexed) - set(names):
+            self.remove(name)
+
+        return count
+
+
+    def close(self) -> None:
+        self.closed = True
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,317 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import json, os, sqlite3, threading, time
+from os.path import join
+from typing import Optional
+from appdirs import AppDirs
+from .conversation import Conversation
+from .state import Storage, JsonStorage
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation (
+    name TEXT PRIMARY KEY,
+    model_name TEXT,
+    count INTEGER NOT NULL DEFAULT 0,
+    -- Goes up with every write, see stamp()
+    changes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS message (
+    conversation TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (conversation, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+UPSERT_CONVERSATION = (
+    'INSERT INTO conversation (name, model_name, count, changes)'
+    ' VALUES (?, ?, ?, 1)'
+    ' ON CONFLICT (name) DO UPDATE SET'
+    ' model_name = excluded.model_name,'
+    ' count = max(count, excluded.count),'
+    ' changes = changes + 1'
+)
+
+
+class SqliteStorage(Storage):
+    """
+    Every conversation in one SQLite database, a row per message keyed by
+    the conversation and its place in it.
+    New messages are written together every fsync_interval seconds by a
+    background thread, so saving only has to write what is left.
+    Another instance can read and write the same database alongside
+    """
+
+    def __init__(self, *, dirs:Optional[AppDirs]=None) -> None:
+        super().__init__(dirs=dirs)
+        self.db_path = join(self.dir.user_data_dir, 'conversations.sqlite3')
+        self.db = None
+        self.lock = threading.Lock()
+        # (name, model_name, seq, data) waiting to be written
+        self.pending = []
+        # Conversations written since the last save
+        self.written = set()
+        self.flush_thread = None
+        self.flush_stop = threading.Event()
+
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Only called with the lock held
+        """
+        if self.db is None:
+            os.makedirs(self.dir.user_data_dir, exist_ok=True)
+            # The other instance may be part way through a write
+            self.db = sqlite3.connect(
+                self.db_path,
+                timeout=10,
+                check_same_thread=False
+            )
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.executescript(SCHEMA)
+
+        return self.db
+
+
+    def get_meta(self, key:str) -> Optional[str]:
+        with self.lock:
+            row = self.connect().execute(
+                'SELECT value FROM meta WHERE key = ?',
+                (key,)
+            ).fetchone()
+
+        return row[0] if row else None
+
+
+    def set_meta(self, key:str, value:str) -> None:
+        with self.lock, self.connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                (key, value)
+            )
+
+
+    def record(self, con:Conversation, index:int) -> None:
+        with self.lock:
+            self.pending.append((
+                con.name,
+                con.model_name,
+                index,
+                json.dumps(con.messages[index])
+            ))
+
+        if self.fsync_interval <= 0:
+            self.flush()
+        else:
+            self._start_flush_thread()
+
+
+    def _start_flush_thread(self) -> None:
+        if self.flush_thread:
+            return
+
+        def flush_forever():
+            while not self.flush_stop.wait(self.fsync_interval):
+                self.flush()
+
+        self.flush_thread = threading.Thread(target=flush_forever, daemon=True)
+        self.flush_thread.start()
+
+
+    def flush(self) -> None:
+        """
+        Write the messages recorded since the last flush in one transaction
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+            if not pending:
+                return
+
+            counts = {}
+            for name, model_name, seq, data in pending:
+                self.written.add(name)
+                count = max(counts.get(name, (None, 0))[1], seq + 1)
+                counts[name] = (model_name, count)
+
+            with self.connect() as db:
+                db.executemany(
+                    'INSERT OR REPLACE INTO message (conversation, seq, data)'
+                    ' VALUES (?, ?, ?)',
+                    [(name, seq, data) for name, model_name, seq, data in pending]
+                )
+                db.executemany(
+                    UPSERT_CONVERSATION,
+                    [(name, model_name, count)
+                        for name, (model_name, count) in counts.items()]
+                )
+
+
+    def remove(self, name:str) -> None:
+        with self.lock:
+            self.pending = [p for p in self.pending if p[0] != name]
+            self.written.discard(name)
+
+            with self.connect() as db:
+                db.execute('DELETE FROM message WHERE conversation = ?', (name,))
+                db.execute('DELETE FROM conversation WHERE name = ?', (name,))
+
+
+    def import_conversation(self, name:str, data:dict) -> None:
+        """
+        Replace the conversation name with data in one go
+        """
+        messages = data['messages']
+        with self.lock, self.connect() as db:
+            db.execute('DELETE FROM message WHERE conversation = ?', (name,))
+            db.executemany(
+                'INSERT INTO message (conversation, seq, data) VALUES (?, ?, ?)',
+                [(name, seq, json.dumps(m)) for seq, m in enumerate(messages)]
+            )
+            db.execute(
+                'INSERT OR REPLACE INTO conversation (name, model_name, count, changes)'
+                ' VALUES (?, ?, ?, 1)',
+                (name, data.get('model_name'), len(messages))
+            )
+
+
+    def conversation_names(self) -> list:
+        self.flush()
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT name FROM conversation ORDER BY rowid'
+            )
+            return [name for name, in rows]
+
+
+    def load_conversation(self, name:str) -> Optional[dict]:
+        self.flush()
+        with self.lock:
+            db = self.connect()
+            row = db.execute(
+                'SELECT model_name FROM conversation WHERE name = ?',
+                (name,)
+            ).fetchone()
+            if not row:
+                return None
+
+            rows = db.execute(
+                'SELECT data FROM message WHERE conversation = ? ORDER BY seq',
+                (name,)
+            )
+            messages = [json.loads(data) for data, in rows]
+
+        return {'name': name, 'model_name': row[0], 'messages': messages}
+
+
+    def load_index(self) -> dict:
+        self.flush()
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT name, model_name, count FROM conversation ORDER BY rowid'
+            )
+            return {
+                name: {'model_name': model_name, 'count': count}
+                for name, model_name, count in rows
+            }
+
+
+    def stamp(self, name:str) -> Optional[list]:
+        with self.lock:
+            row = self.connect().execute(
+                'SELECT count, changes FROM conversation WHERE name = ?',
+                (name,)
+            ).fetchone()
+
+        return list(row) if row else None
+
+
+    def save_all_conversations(self, conversations:list) -> None:
+        """
+        Messages have been written as they happened, what is left are
+        deleted conversations, new empty ones and messages that were added
+        without being recorded
+        """
+        self.flush_stop.set()
+        self.flush()
+
+        with self.lock, self.connect() as db:
+            stored = {
+                name: (count, model_name) for name, count, model_name in
+                db.execute('SELECT name, count, model_name FROM conversation')
+            }
+
+            for con in conversations:
+                if con.mark_for_deletion:
+                    db.execute(
+                        'DELETE FROM message WHERE conversation = ?',
+                        (con.name,)
+                    )
+                    db.execute('DELETE FROM conversation WHERE name = ?', (con.name,))
+                    continue
+
+                row = stored.get(con.name)
+                count, model_name = row if row else (0, None)
+
+                if con.loaded and len(con.messages) > count:
+                    db.executemany(
+                        'INSERT OR REPLACE INTO message (conversation, seq, data)'
+                        ' VALUES (?, ?, ?)',
+                        [(con.name, seq, json.dumps(con.messages[seq]))
+                            for seq in range(count, len(con.messages))]
+                    )
+                elif row and model_name == con.model_name:
+                    continue
+
+                db.execute(
+                    UPSERT_CONVERSATION,
+                    (con.name, con.model_name, len(con))
+                )
+                self.written.add(con.name)
+
+            written, self.written = self.written, set()
+
+        if self.search:
+            for con in conversations:
+                if con.mark_for_deletion:
+                    self.search.remove(con.name)
+                elif con.name in written:
+                    self.search.saved(con.name, self.stamp(con.name))
+
+
+def migrate(source:JsonStorage, target:SqliteStorage) -> int:
+    """
+    Copy every conversation from the JSON files into SQLite, the files are
+    left as they are. Returns how many were copied
+    """
+    count = 0
+    for name in source.conversation_names():
+        data = source.load_conversation(name)
+        if data:
+            target.import_conversation(name, data)
+            count+= 1
+
+    target.set_meta('migrated', str(time.time()))
+    return count
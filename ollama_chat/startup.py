@@ -0,0 +1,91 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from __future__ import annotations
+
+import sys, time
+from contextlib import contextmanager
+from typing import Optional
+
+# Nothing in here may import PyQt, it is timing that
+
+
+class StartupProfile:
+    """
+    Times the steps of starting up for --profile-startup,
+    does nothing until enable() is called.
+    Times are milliseconds from when the script started
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.started = time.perf_counter()
+        # (name, at, took, top level modules imported)
+        self.steps = []
+
+
+    def enable(self, started:Optional[float]=None) -> None:
+        self.enabled = True
+        self.started = started if started else time.perf_counter()
+
+
+    @contextmanager
+    def step(self, name:str):
+        if not self.enabled:
+            yield
+            return
+
+        started = time.perf_counter()
+        modules = set(sys.modules)
+        try:
+            yield
+        finally:
+            imported = sorted({
+                module.split('.')[0] for module in set(sys.modules) - modules
+                if not module.startswith('_')
+            })
+            self.steps.append((
+                name,
+                started - self.started,
+                time.perf_counter() - started,
+                imported
+            ))
+
+
+    def mark(self, name:str) -> None:
+        """
+        Something that happens rather than takes time, e.g. the first paint
+        """
+        if self.enabled:
+            self.steps.append((name, time.perf_counter() - self.started, None, []))
+
+
+    def report(self) -> str:
+        lines = ['%-40s %9s %9s' % ('Step', 'At ms', 'Took ms')]
+        for name, at, took, imported in self.steps:
+            lines.append('%-40s %9.1f %9s' % (
+                name,
+                at * 1000,
+                '' if took is None else '%.1f' % (took * 1000)
+            ))
+            if imported:
+                lines.append('    imports ' + ', '.join(imported))
+
+        return '\n'.join(lines)
+
+
+profile = StartupProfile()
@@ -17,12 +17,16 @@
 """
 from __future__ import annotations
 
-import json, re
+import json, re, os, sys, threading, tempfile, copy, time
 from appdirs import *
 from os import path, remove
 from os.path import join, exists
 from .conversation import Conversation
 from .bindings import Bindings
+from .response_cache import response_cache
+from .search import SearchIndex
+from . import archive
+from abc import ABC, abstractmethod
 import glob
 
 
@@ -41,20 +45,177 @@ def filter_dict(spec:dict, source) -> dict:
 
 
 def try_read_json_file(file_path:str):
+    """
+    None if the file can't be read, a missing file is normal on a new profile.
+    Problems go to stderr as stdout may be carrying --batch results
+    """
     try:
         return json.loads(open(file_path, "r").read())
+    except FileNotFoundError:
+        pass
     except Exception as e:
-        print(e)
+        print(e, file=sys.stderr)
 
     return None
 
 
-class Storage:
+def write_file_atomic(file_path:str, text:str) -> None:
+    """
+    Write to a temporary file next to file_path and rename it over the top,
+    so a crash part way through never leaves a half written file
+    """
+    os.makedirs(path.dirname(file_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.dirname(file_path),
+        prefix='.' + path.basename(file_path),
+        suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'w') as tmp:
+            tmp.write(text)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, file_path)
+    except Exception:
+        if exists(tmp_path):
+            remove(tmp_path)
+        raise
+
+
+class Journal:
+    """
+    Append only record of the messages in a conversation, one JSON object
+    per line, written as the messages happen.
+    Each message record has its index in the conversation as "i" so
+    replaying the journal on top of a snapshot that already has some of the
+    messages in it is harmless.
+    records is how many are in the file when it is known, e.g. from the
+    index, otherwise the file is counted the first time it is asked for
+    """
+
+    def __init__(self, file_path:str, records:Optional[int]=None) -> None:
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.file = None
+        self.dirty = False
+        self.compacting = False
+        self._records = records
+
+
+    @property
+    def records(self) -> int:
+        if self._records is None:
+            self._records = len(self.read(self.file_path))
+        return self._records
+
+
+    @records.setter
+    def records(self, records:int) -> None:
+        self._records = records
+
+
+    @staticmethod
+    def read(file_path:str) -> list:
+        records = []
+        if not exists(file_path):
+            return records
+
+        for line in open(file_path, 'r'):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # The last line might be cut short by a crash
+                pass
+
+        return records
+
+
+    @staticmethod
+    def replay(records:list, data:dict) -> dict:
+        messages = data['messages']
+        for record in records:
+            if 'model_name' in record:
+                data['model_name'] = record['model_name']
+            elif 'i' in record:
+                message = {k: v for k, v in record.items() if k != 'i'}
+                if record['i'] < len(messages):
+                    messages[record['i']] = message
+                else:
+                    messages.append(message)
+
+        return data
+
+
+    def append(self, record:dict) -> None:
+        with self.lock:
+            if self.file is None:
+                os.makedirs(path.dirname(self.file_path), exist_ok=True)
+                self.file = open(self.file_path, 'a')
+
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            self.dirty = True
+            self.records+= 1
+
+
+    def sync(self) -> None:
+        with self.lock:
+            if self.file and self.dirty:
+                os.fsync(self.file.fileno())
+                self.dirty = False
+
+
+    def drop_before(self, index:int) -> None:
+        """
+        Remove the message records that a snapshot now holds
+        """
+        with self.lock:
+            self._close()
+            records = [r for r in self.read(self.file_path)
+                if r.get('i', index) >= index]
+
+            write_file_atomic(
+                self.file_path,
+                ''.join(json.dumps(r) + '\n' for r in records)
+            )
+            self.records = len(records)
+
+
+    def remove(self) -> None:
+        with self.lock:
+            self._close()
+            self.records = 0
+            if exists(self.file_path):
+                remove(self.file_path)
+
+
+    def _close(self) -> None:
+        if self.file:
+            self.file.close()
+            self.file = None
+            self.dirty = False
+
+
+class Storage(ABC):
+    """
+    Where the settings, conversations and metrics are kept.
+    The settings are always in config.json, JsonStorage and SqliteStorage
+    each keep the conversations their own way, see open_storage()
+    """
+
     def __init__(self, *, dirs:Optional[AppDirs]=None) -> None:
         self.dir = dirs if dirs else AppDirs('ollama-chat', 'nshiell')
         self.config_file_path = join(self.dir.user_config_dir, 'config.json')
         self._config = None
-        #self._conversations = None
+
+        self.fsync_interval = 2
+        self.compact_after = 100
+        # Conversations left alone this long are compressed, 0 is never
+        self.archive_after_days = 0
+        self.archive_compression = 'gzip'
+        self.metrics_log = True
+        # A SearchIndex once open_search() has been called
+        self.search = None
 
 
     @property
@@ -67,11 +228,158 @@ class Storage:
     @config.setter
     def config(self, config):
         self._config = config
-        open(self.config_file_path, "w").write(
+        write_file_atomic(
+            self.config_file_path,
             json.dumps(config, indent=4, sort_keys=True)
         )
 
 
+    @property
+    def metrics_path(self) -> str:
+        return join(self.dir.user_data_dir, 'metrics.jsonl')
+
+
+    def log_metrics(self, name:str, metrics:dict) -> None:
+        """
+        One line per reply, for comparing models and servers over time
+        """
+        os.makedirs(self.dir.user_data_dir, exist_ok=True)
+        record = dict(metrics, time=round(time.time(), 3), conversation=name)
+        with open(self.metrics_path, 'a') as file:
+            file.write(json.dumps(record) + '\n')
+
+
+    @property
+    def search_path(self) -> str:
+        return join(self.dir.user_data_dir, 'search.sqlite3')
+
+
+    def open_search(self) -> Optional[SearchIndex]:
+        if self.search:
+            return self.search
+
+        try:
+            os.makedirs(self.dir.user_data_dir, exist_ok=True)
+            self.search = SearchIndex(self.search_path)
+        except Exception:
+            # e.g. an SQLite built without FTS5
+            self.search = None
+
+        return self.search
+
+
+    def setup_journals(self, fsync_interval:int, compact_after:int) -> None:
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+
+
+    def setup_archive(self, after_days:int, compression:str) -> None:
+        self.archive_after_days = after_days
+        self.archive_compression = archive.compression_to_use(compression)
+
+
+    def attach_journal(self, con:Conversation) -> None:
+        """
+        Record the messages of con as they are finished
+        """
+        def record(message):
+            # A reply can still finish after the conversation was discarded
+            if con.mark_for_deletion:
+                return
+
+            index = len(con.messages) - 1
+            self.record(con, index)
+            if self.search:
+                self.search.add(con.name, index, con.messages[index])
+            if self.metrics_log and 'metrics' in con.messages[index]:
+                self.log_metrics(con.name, con.messages[index]['metrics'])
+
+        con.bind('add_user_message', record)
+        con.bind('finish_assistant_message', record)
+        con.bind('discard', lambda: self.discard(con))
+        # Recorded again, it replaces the one that is kept
+        con.bind('pin', lambda index: self.record(con, index))
+
+
+    def discard(self, con:Conversation) -> None:
+        """
+        Remove con from disk now, so it doesn't come back after a crash
+        """
+        self.remove(con.name)
+        if self.search:
+            self.search.remove(con.name)
+
+
+    @abstractmethod
+    def record(self, con:Conversation, index:int) -> None:
+        """
+        Keep the message at index of con, it is new or has just finished
+        """
+        pass
+
+
+    @abstractmethod
+    def remove(self, name:str) -> None:
+        """
+        Delete everything kept of the conversation name
+        """
+        pass
+
+
+    @abstractmethod
+    def conversation_names(self) -> list:
+        pass
+
+
+    @abstractmethod
+    def load_conversation(self, name:str) -> Optional[dict]:
+        """
+        The name, model_name and messages of a conversation
+        """
+        pass
+
+
+    @abstractmethod
+    def load_index(self) -> dict:
+        """
+        name => model_name and message count of every conversation,
+        without reading their messages
+        """
+        pass
+
+
+    @abstractmethod
+    def stamp(self, name:str):
+        """
+        Something JSON that changes whenever the conversation name does
+        """
+        pass
+
+
+    @abstractmethod
+    def save_all_conversations(self, conversations:list) -> None:
+        pass
+
+
+class JsonStorage(Storage):
+    """
+    A JSON snapshot per conversation in user_config_dir with a journal of
+    the messages added since, folded into the snapshot now and then.
+    Snapshots that haven't changed for archive_after_days are compressed,
+    they go back to plain JSON when the conversation next changes
+    """
+
+    def __init__(self, *, dirs:Optional[AppDirs]=None) -> None:
+        super().__init__(dirs=dirs)
+        #self._conversations = None
+
+        self.journals = {}
+        self.snapshot_lock = threading.Lock()
+        self.sync_thread = None
+        # What load_index() last found
+        self.index = {}
+
+
     def conversations(self):
         if not self._conversations:
             self._conversations = self._load_conversations()
@@ -80,33 +388,341 @@ class Storage:
             yield conversation_dict
 
 
+    def snapshot_path(self, name:str) -> str:
+        return join(self.dir.user_config_dir, name + '.conversation.json')
+
+
+    def journal_path(self, name:str) -> str:
+        return join(self.dir.user_config_dir, name + '.conversation.jsonl')
+
+
+    def archive_path(self, name:str) -> Optional[str]:
+        """
+        The compressed snapshot of name if it has been archived
+        """
+        for suffix in archive.SUFFIXES.values():
+            file_path = self.snapshot_path(name) + suffix
+            if exists(file_path):
+                return file_path
+
+        return None
+
+
+    def has_snapshot(self, name:str) -> bool:
+        return exists(self.snapshot_path(name)) or bool(self.archive_path(name))
+
+
+    def remove_archive(self, name:str) -> None:
+        archive_path = self.archive_path(name)
+        if archive_path:
+            remove(archive_path)
+
+
+    def attach_journal(self, con:Conversation) -> Journal:
+        """
+        Record the messages of con to its journal as they are finished
+        """
+        entry = self.index.get(con.name, {})
+        self.journals[con.name] = Journal(
+            self.journal_path(con.name),
+            entry.get('journal_records')
+        )
+        super().attach_journal(con)
+
+        self._start_sync_thread()
+        return self.journals[con.name]
+
+
+    def record(self, con:Conversation, index:int) -> None:
+        journal = self.journals[con.name]
+        if not journal.records and not self.has_snapshot(con.name):
+            journal.append({'model_name': con.model_name})
+
+        journal.append(dict(con.messages[index], i=index))
+        if journal.records >= self.compact_after and not journal.compacting:
+            self.compact(con)
+
+
+    def remove(self, name:str) -> None:
+        with self.snapshot_lock:
+            journal = self.journals.pop(name, None)
+            if journal:
+                journal.remove()
+
+            if exists(self.snapshot_path(name)):
+                remove(self.snapshot_path(name))
+            self.remove_archive(name)
+
+
+    def _start_sync_thread(self) -> None:
+        if self.sync_thread or self.fsync_interval <= 0:
+            return
+
+        def sync_forever():
+            while not self.sync_stop.wait(self.fsync_interval):
+                for journal in list(self.journals.values()):
+                    journal.sync()
+
+        self.sync_stop = threading.Event()
+        self.sync_thread = threading.Thread(target=sync_forever, daemon=True)
+        self.sync_thread.start()
+
+
+    def compact(self, con:Conversation) -> threading.Thread:
+        """
+        Fold the journal into a new snapshot in the background
+        """
+        data = json.loads(json.dumps(dict(con)))
+        count = len(data['messages'])
+        journal = self.journals.get(con.name)
+
+        # Only one at a time, an older snapshot must never land after a newer
+        if journal:
+            journal.compacting = True
+
+        def write_snapshot():
+            try:
+                with self.snapshot_lock:
+                    # Discarded while this was waiting for the lock
+                    if con.mark_for_deletion:
+                        return
+
+                    write_file_atomic(
+                        self.snapshot_path(con.name),
+                        json.dumps(data, indent=4, sort_keys=True)
+                    )
+                    self.remove_archive(con.name)
+                    if journal:
+                        journal.drop_before(count)
+            finally:
+                if journal:
+                    journal.compacting = False
+
+        thread = threading.Thread(target=write_snapshot, daemon=True)
+        thread.start()
+        return thread
+
+
     def save_all_conversations(self, conversations:list):
+        if self.sync_thread:
+            self.sync_stop.set()
+
+        with self.snapshot_lock:
+            for con in conversations:
+                path = self.snapshot_path(con.name)
+                journal = self.journals.pop(con.name, None)
+
+                if con.mark_for_deletion:
+                    if exists(path):
+                        remove(path)
+                    self.remove_archive(con.name)
+                elif not self.has_snapshot(con.name) or (journal and journal.records):
+                    json_text = json.dumps(dict(con), indent=4, sort_keys=True)
+                    write_file_atomic(path, json_text)
+                    self.remove_archive(con.name)
+
+                if journal:
+                    journal.remove()
+
+                if self.archive_after_days and not con.mark_for_deletion:
+                    self.archive_if_cold(con.name)
+
+                if self.search and con.mark_for_deletion:
+                    self.search.remove(con.name)
+                elif self.search and journal:
+                    self.search.saved(con.name, self.stamp(con.name))
+
+            self.update_index(conversations)
+
+
+    def archive_if_cold(self, name:str) -> bool:
+        """
+        Compress the snapshot of name if it is older than archive_after_days
+        and has no journal, only called with the snapshot_lock held
+        """
+        path = self.snapshot_path(name)
+        try:
+            modified = os.stat(path).st_mtime
+        except OSError:
+            return False
+
+        if exists(self.journal_path(name)):
+            return False
+        if time.time() - modified < self.archive_after_days * 24 * 60 * 60:
+            return False
+
+        data = try_read_json_file(path)
+        if data is None:
+            return False
+
+        archive_path = path + archive.SUFFIXES[self.archive_compression]
+        archive.write_archive(archive_path, data, self.archive_compression)
+        # So it is still known when it was last changed
+        os.utime(archive_path, (modified, modified))
+        remove(path)
+        return True
+
+
+    def conversation_names(self) -> list:
+        names = []
+        if not exists(self.dir.user_config_dir):
+            return names
+
+        suffixes = ['.conversation.json', '.conversation.jsonl'] + [
+            '.conversation.json' + suffix for suffix in archive.SUFFIXES.values()
+        ]
+        for entry in os.scandir(self.dir.user_config_dir):
+            for suffix in suffixes:
+                if entry.name.endswith(suffix):
+                    name = entry.name[:-len(suffix)]
+                    if name and not name.startswith('.') and name not in names:
+                        names.append(name)
+
+        return names
+
+
+    def load_conversation(self, name:str) -> Optional[dict]:
+        data = None
+        if exists(self.snapshot_path(name)):
+            data = try_read_json_file(self.snapshot_path(name))
+        elif self.archive_path(name):
+            try:
+                data = archive.read_archive(self.archive_path(name))
+            except Exception as e:
+                print(e, file=sys.stderr)
+
+        records = Journal.read(self.journal_path(name))
+        if not data and not records:
+            return None
+
+        # Messages that didn't make it into the snapshot before the
+        # program was last stopped
+        data = Journal.replay(
+            records,
+            data if data else {'messages': [], 'model_name': None}
+        )
+        data['name'] = name
+        return data
+
+
+    def load_conversations(self):
+        for name in self.conversation_names():
+            data = self.load_conversation(name)
+            if data:
+                yield data
+
+
+    @property
+    def index_path(self) -> str:
+        return join(self.dir.user_config_dir, 'index.json')
+
+
+    def file_stats(self, name:str) -> list:
+        stats = []
+        file_paths = (
+            self.snapshot_path(name),
+            self.journal_path(name),
+            self.archive_path(name)
+        )
+        for file_path in file_paths:
+            if file_path is None:
+                stats.append(None)
+                continue
+
+            try:
+                stat = os.stat(file_path)
+                stats.append([stat.st_size, stat.st_mtime_ns])
+            except OSError:
+                stats.append(None)
+
+        return stats
+
+
+    def stamp(self, name:str) -> list:
+        return self.file_stats(name)
+
+
+    def index_entry(self,
+            name:str,
+            model_name,
+            count:int,
+            journal_records:int) -> dict:
+        return {
+            'model_name': model_name,
+            'count': count,
+            'journal_records': journal_records,
+            'files': self.file_stats(name)
+        }
+
+
+    def load_index(self) -> dict:
+        """
+        Get the name, model and message count of every conversation without
+        reading them, only conversations whose files have changed since the
+        index was written are read
+        """
+        index = try_read_json_file(self.index_path) if exists(self.index_path) else None
+        if not isinstance(index, dict):
+            index = {}
+
+        new_index = {}
+        for name in self.conversation_names():
+            entry = index.get(name)
+            if not entry or entry.get('files') != self.file_stats(name):
+                data = self.load_conversation(name)
+                if not data:
+                    continue
+                entry = self.index_entry(
+                    name,
+                    data['model_name'],
+                    len(data['messages']),
+                    len(Journal.read(self.journal_path(name)))
+                )
+            new_index[name] = entry
+
+        if new_index != index:
+            self.save_index(new_index)
+
+        self.index = new_index
+        return new_index
+
+
+    def save_index(self, index:dict) -> None:
+        write_file_atomic(self.index_path, json.dumps(index))
+
+
+    def update_index(self, conversations:list) -> None:
+        index = {}
         for con in conversations:
-            filename = con.name + '.conversation.json'
-            path = join(self.dir.user_config_dir, filename)
+            if not con.mark_for_deletion:
+                # The journals have been folded into the snapshots
+                index[con.name] = self.index_entry(
+                    con.name,
+                    con.model_name,
+                    len(con),
+                    0
+                )
 
-            if con.mark_for_deletion:
-                if exists(path):
-                    remove(path)
-            else:
-                json_text = json.dumps(dict(con), indent=4, sort_keys=True)
-                open(path, "w").write(json_text)
+        self.save_index(index)
 
 
-    def load_conversations(self):
-        glob_path = glob.glob(join(
-            self.dir.user_config_dir,
-            '*.conversation.json'
-        ))
+def open_storage(dirs:Optional[AppDirs]=None) -> Storage:
+    """
+    The storage the settings ask for. The first time SQLite is used the
+    conversations in the JSON files are copied into it
+    """
+    storage = JsonStorage(dirs=dirs)
+    config = storage.config
+    if not isinstance(config, dict) or config.get('storage') != 'sqlite':
+        return storage
 
-        for con_path in glob_path:
-            name_match = re.findall(r'^.*/(.*)\.conversation\.json$', con_path)
+    from .sqlite_storage import SqliteStorage, migrate
+    sqlite_storage = SqliteStorage(dirs=storage.dir)
+    sqlite_storage._config = config
+    if not sqlite_storage.get_meta('migrated'):
+        migrate(storage, sqlite_storage)
 
-            if name_match:
-                data = try_read_json_file(con_path)
-                if data:
-                    data['name'] = name_match[0]
-                    yield data
+    return sqlite_storage
 
 
 class State:
@@ -114,43 +730,194 @@ class State:
     Holds the runtime configuration and chat history.
     It can be loaded from and saved to a JSON files
     """
+    default_settings = {
+        'model_name': 'mistral-nemo:latest',
+        'style': 'Blue',
+        'context': 'You are being used in a IM style chat program',
+        'url': 'http://127.0.0.1:11434',
+        'font': 'Arial',
+        'font_size': 12,
+        # Milliseconds between pushing streamed words to the UI, 0 is off
+        'flush_interval': 25,
+        'flush_chars': 1024,
+        # Conversations this long open in a list view, 0 is off
+        'virtual_view_threshold': 500,
+        # Messages shown when a window opens, older ones load in chunks
+        'history_initial': 30,
+        'history_chunk': 20,
+        # Seconds between flushing conversation journals to disk
+        'journal_fsync_interval': 2,
+        # Journal records before they get folded into the snapshot
+        'journal_compact_after': 100,
+        # Seconds before a server's model list is fetched again
+        'models_ttl': 60,
+        # Keep the start of each request the same so the server can reuse it
+        'stable_prompt': True,
+        # Tokens, the reserve is kept free for the reply
+        'context_length': 4096,
+        'context_reserve': 1024,
+        # Model name => num_ctx to ask the server for
+        'model_context_lengths': {},
+        # Load models in the background before they are asked anything
+        'warm_up': True,
+        'warm_up_interval': 60,
+        # Model name => how long the server keeps it loaded, e.g. "30m"
+        'keep_alive': {},
+        'keep_alive_default': '',
+        # HTTP connections kept per server
+        'pool_max_connections': 10,
+        'pool_max_keepalive': 5,
+        # "thread" or "asyncio"
+        'engine': 'thread',
+        # Requests sent to a server at once, the rest wait in a queue
+        'max_parallel_requests': 2,
+        # Timings of each reply, shown under it and/or logged to metrics.jsonl
+        'show_metrics': False,
+        # Show the replies as Markdown rather than plain text
+        'markdown': True,
+        'metrics_log': True,
+        # More servers to share the requests with url
+        'urls': [],
+        'health_interval': 15,
+        # Answer a question asked before with the same model from a cache,
+        # kept in memory and up to the size in MB on disk
+        'response_cache': False,
+        'response_cache_entries': 128,
+        'response_cache_disk_mb': 50,
+        # Keep a full-text index of every conversation for searching
+        'search_index': True,
+        # Where conversations are kept, "json" or "sqlite",
+        # takes effect the next time the program starts
+        'storage': 'json',
+        # Compress conversations that haven't changed for this many days,
+        # 0 is never. "gzip", or "zstd" if zstandard is installed
+        'archive_after_days': 0,
+        'archive_compression': 'gzip'
+    }
+
+    settings_spec = {
+        'context': str,
+        'font': str,
+        'font_size': int,
+        'model_name': str,
+        'style': str,
+        'url': str,
+        'flush_interval': int,
+        'flush_chars': int,
+        'virtual_view_threshold': int,
+        'history_initial': int,
+        'history_chunk': int,
+        'journal_fsync_interval': int,
+        'journal_compact_after': int,
+        'models_ttl': int,
+        'stable_prompt': bool,
+        'context_length': int,
+        'context_reserve': int,
+        'model_context_lengths': dict,
+        'warm_up': bool,
+        'warm_up_interval': int,
+        'keep_alive': dict,
+        'keep_alive_default': str,
+        'pool_max_connections': int,
+        'pool_max_keepalive': int,
+        'engine': str,
+        'max_parallel_requests': int,
+        'show_metrics': bool,
+        'markdown': bool,
+        'metrics_log': bool,
+        'urls': list,
+        'health_interval': int,
+        'response_cache': bool,
+        'response_cache_entries': int,
+        'response_cache_disk_mb': int,
+        'search_index': bool,
+        'storage': str,
+        'archive_after_days': int,
+        'archive_compression': str
+    }
+
     def __init__(self, *, storage:Optional[Storage]=None) -> None:
-        self.storage = storage if storage else Storage()
+        self.storage = storage if storage else open_storage()
         self.settings = self._get_settings()
+        self.storage.setup_journals(
+            self.settings['journal_fsync_interval'],
+            self.settings['journal_compact_after']
+        )
+        self.storage.setup_archive(
+            self.settings['archive_after_days'],
+            self.settings['archive_compression']
+        )
+        self.storage.metrics_log = self.settings['metrics_log']
+        self.setup_response_cache()
+        if self.settings['search_index']:
+            self.storage.open_search()
         self.conversations = self.load_conversations()
 
 
+    def setup_response_cache(self) -> None:
+        response_cache.configure(
+            self.settings['response_cache'],
+            self.settings['response_cache_entries'],
+            join(self.storage.dir.user_data_dir, 'response-cache'),
+            self.settings['response_cache_disk_mb'] * 1024 * 1024
+        )
+
+
     def _get_settings(self):
         settings = self.storage.config
 
         if settings is None:
-            settings = {
-                'model_name': 'mistral-nemo:latest',
-                'style': 'Blue',
-                'context': 'You are being used in a IM style chat program',
-                'url': 'http://127.0.0.1:11434',
-                'font': 'Arial',
-                'font_size': 12
-            }
-
-        return filter_dict({
-            'context': str,
-            'font': str,
-            'font_size': int,
-            'model_name': str,
-            'style': str,
-            'url': str,
-        }, settings)
+            settings = copy.deepcopy(self.default_settings)
+
+        settings = filter_dict(self.settings_spec, settings)
+
+        # Older config files won't have the newer settings in them
+        for name, value in settings.items():
+            if value is None:
+                settings[name] = copy.deepcopy(self.default_settings[name])
+
+        return settings
 
 
     def load_conversations(self):
+        """
+        Only the index is read here,
+        messages are loaded when a conversation is first used
+        """
         conversations = []
-        for conversation_dict in self.storage.load_conversations():
-            conversations.append(Conversation(**conversation_dict))
+        for name, entry in self.storage.load_index().items():
+            conversation = Conversation(
+                messages=None,
+                model_name=entry['model_name'] or self.settings['model_name'],
+                name=name,
+                loader=self._message_loader(name),
+                count=entry['count']
+            )
+            self.storage.attach_journal(conversation)
+            conversations.append(conversation)
 
         return conversations
 
 
+    def _message_loader(self, name:str):
+        def load():
+            data = self.storage.load_conversation(name)
+            return data['messages'] if data else []
+
+        return load
+
+
+    def new_conversation(self) -> Conversation:
+        conversation = Conversation(
+            messages=[],
+            model_name=self.settings['model_name']
+        )
+        self.storage.attach_journal(conversation)
+        self.conversations.append(conversation)
+
+        return conversation
+
+
     def save(self):
         self.storage.save_all_conversations(self.conversations)
         self.storage.config = self.settings
@@ -20,78 +20,435 @@ from __future__ import annotations
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
-from .window_mixin import WindowMixin
+from .window_mixin import WindowMixin, ui_templates, ui_file_path
 from .model import *
 from .conversation import Conversation
 from .bindings import Bindings
 from typing import Optional
-from ollama import Client
 from .asker import *
-
-class ScrollAreaChat(QScrollArea):
-    def __init__(self):
-        super().__init__()
-
-        self.at_bottom = True  # Assume initially at bottom
-        self.bind()
-
+from .context_window import ContextWindow
+from .scheduler import scheduler
+from .metrics import describe
+from .search import SearchIndex, MATCH_START, MATCH_END
+from .markdown import BlockSplitter, fragment, render_cache
+from time import monotonic
+import html
+
+class StickToBottomMixin:
+    """
+    Keeps a scrolling widget pinned to the bottom as content is added,
+    unless the user has scrolled up
+    """
 
     def bind(self):
+        # While keep_from_bottom is set, content added above what is on
+        # screen doesn't move it
+        self.from_bottom = 0
+        self.keep_from_bottom = False
+
         vscroll = self.verticalScrollBar()
         vscroll.rangeChanged.connect(self.scroll_to_bottom_if_needed)
         vscroll.valueChanged.connect(self.store_at_bottom_state)
 
 
     def store_at_bottom_state(self, value):
-        min_snap = self.verticalScrollBar().maximum() - 10
-        self.at_bottom = value >= min_snap
+        maximum = self.verticalScrollBar().maximum()
+        self.at_bottom = value >= maximum - 10
+        self.from_bottom = maximum - value
 
 
     def scroll_to_bottom_if_needed(self, minimum, maximum):
         if self.at_bottom:
             self.verticalScrollBar().setValue(maximum)
+        elif self.keep_from_bottom:
+            self.verticalScrollBar().setValue(maximum - self.from_bottom)
+
+
+class ScrollAreaChat(QScrollArea, StickToBottomMixin):
+    def __init__(self):
+        super().__init__()
+
+        self.at_bottom = True  # Assume initially at bottom
+        self.bind()
+
+
+class ConversationModel(QAbstractListModel):
+    """
+    Exposes Conversation.messages as rows for ListViewChat
+    """
+    RoleRole = Qt.UserRole + 1
+
+    def __init__(self, conversation:Conversation) -> None:
+        super().__init__()
+        self.conversation = conversation
+        self.rows = len(conversation)
+
+        conversation.bind('add_user_message', self.message_added)
+        conversation.bind('add_word', self.word_added)
+
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else self.rows
+
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.rows:
+            return None
+
+        message = self.conversation.messages[index.row()]
+        if role == Qt.DisplayRole:
+            return message['content']
+        if role == self.RoleRole:
+            return message['role']
+
+        return None
+
+
+    def message_added(self, *args) -> None:
+        count = len(self.conversation.messages)
+        if count > self.rows:
+            self.beginInsertRows(QModelIndex(), self.rows, count - 1)
+            self.rows = count
+            self.endInsertRows()
+
+
+    def word_added(self, word) -> None:
+        if len(self.conversation.messages) > self.rows:
+            self.message_added()
+        else:
+            last = self.index(self.rows - 1)
+            self.dataChanged.emit(last, last)
+
+
+class BubbleDelegate(QStyledItemDelegate):
+    """
+    Paints a message as a bubble.
+    Heights are cached per row, and only rows that get painted have a
+    QTextDocument built for them
+    """
+    margin = 6
+    padding = 12
+    radius = 20
+    max_documents = 64
+
+    gradients = {
+        'assistant': ['#5577AA', '#2244AA', '#111199', '#000044'],
+        'user': ['#335544', '#224433', '#113322', '#002200']
+    }
+
+    def __init__(self, view) -> None:
+        super().__init__(view)
+        self.view = view
+        self.username = getpass.getuser()
+        self.size_hints = {}
+        self.documents = {}
+
+
+    def bubble_width(self) -> int:
+        return max(int(self.view.viewport().width() * 0.6), 100)
+
+
+    def document(self, index, width:int) -> QTextDocument:
+        text = index.data(Qt.DisplayRole) or ''
+        key = (index.row(), len(text), width)
+
+        if key not in self.documents:
+            if len(self.documents) >= self.max_documents:
+                self.documents.pop(next(iter(self.documents)))
+
+            document = QTextDocument()
+            document.setDocumentMargin(0)
+            document.setDefaultFont(self.view.font())
+            document.setPlainText(text)
+            document.setTextWidth(width)
+            self.documents[key] = document
+
+        return self.documents[key]
+
+
+    def author(self, index) -> str:
+        if index.data(ConversationModel.RoleRole) == 'user':
+            return self.username
+        return 'AI'
+
+
+    def sizeHint(self, option, index) -> QSize:
+        width = self.bubble_width()
+        text = index.data(Qt.DisplayRole) or ''
+        cached = self.size_hints.get(index.row())
+
+        if cached and cached[0] == width and cached[1] == len(text):
+            return cached[2]
+
+        text_width = width - 2 * self.padding
+        text_height = self.document(index, text_width).size().height()
+        line_height = self.view.fontMetrics().lineSpacing()
+
+        size = QSize(
+            self.view.viewport().width(),
+            int(text_height) + line_height + 2 * (self.padding + self.margin)
+        )
+        self.size_hints[index.row()] = (width, len(text), size)
+
+        return size
+
+
+    def paint(self, painter, option, index) -> None:
+        width = self.bubble_width()
+        role = index.data(ConversationModel.RoleRole)
+        rect = option.rect.adjusted(
+            self.margin, self.margin, -self.margin, -self.margin
+        )
+
+        if role == 'user':
+            rect.setLeft(rect.right() - width)
+        else:
+            rect.setWidth(width)
+
+        gradient = QLinearGradient(QPointF(rect.bottomLeft()), QPointF(rect.topLeft()))
+        colors = self.gradients.get(role, self.gradients['assistant'])
+        for stop, color in zip((0.95, 0.8, 0.2, 0), colors):
+            gradient.setColorAt(stop, QColor(color))
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QBrush(gradient))
+        painter.drawRoundedRect(QRectF(rect), self.radius, self.radius)
+
+        painter.setPen(option.palette.color(QPalette.Text))
+        text_rect = rect.adjusted(
+            self.padding, self.padding, -self.padding, -self.padding
+        )
+        painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignTop, self.author(index))
+
+        painter.translate(
+            text_rect.left(),
+            text_rect.top() + self.view.fontMetrics().lineSpacing()
+        )
+        self.document(index, text_rect.width()).drawContents(painter)
+        painter.restore()
+
+
+class ListViewChat(QListView, StickToBottomMixin):
+    """
+    Shows a conversation with model/view so only the visible messages are
+    laid out and painted, for very long conversations
+    """
+
+    def __init__(self, conversation:Conversation) -> None:
+        super().__init__()
+        self.at_bottom = True
+        self.bind()
+
+        self.setModel(ConversationModel(conversation))
+        self.setItemDelegate(BubbleDelegate(self))
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.Adjust)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(100)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+
+        # A growing reply changes the row height so the rows need relaying
+        self.model().dataChanged.connect(
+            lambda top_left, bottom_right:
+                self.itemDelegate().sizeHintChanged.emit(top_left)
+        )
+        self.scrollToBottom()
+
+
+class TextBubble(QTextBrowser):
+    """
+    Read only text that grows to fit its contents like a word wrapped QLabel.
+    Words are inserted at the end of the document rather than replacing all
+    of the text, so only the last paragraph is laid out again.
+    As Markdown only the open block at the end is rendered again as words
+    arrive, the blocks before it are left as they are
+    """
+
+    def __init__(self, text='', markdown:bool=False):
+        super().__init__()
+        self.markdown = markdown
+        self.source = ''
+        # None unless the text is being streamed in from the start
+        self.splitter = None
+        # Where the open block starts in the document
+        self.tail_start = 0
+
+        self.setFrameShape(QFrame.NoFrame)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        self.setOpenExternalLinks(True)
+        self.viewport().setAutoFillBackground(False)
+        self.setStyleSheet('background: transparent;')
+        self.document().setDocumentMargin(0)
+
+        self.document().documentLayout().documentSizeChanged.connect(
+            self.fit_height
+        )
+        self.setText(text)
+
+
+    def text(self) -> str:
+        return self.source if self.markdown else self.toPlainText()
+
+
+    def setText(self, text:str) -> None:
+        if not self.markdown:
+            self.setPlainText(text)
+            return
+
+        self.clear()
+        self.source = text
+        self.splitter = None if text else BlockSplitter()
+        self.tail_start = 0
+        if text:
+            QTextCursor(self.document()).insertFragment(
+                render_cache.fragment(text)
+            )
+
+
+    def append_text(self, text:str) -> None:
+        cursor = QTextCursor(self.document())
+
+        if not self.markdown:
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(text)
+            return
+
+        if self.splitter is None:
+            self.setText(self.source + text)
+            return
+
+        self.source+= text
+        cursor.beginEditBlock()
+        for block in self.splitter.feed(text):
+            self.render_tail(cursor, block)
+            self.tail_start = cursor.position()
+        self.render_tail(cursor, self.splitter.tail)
+        cursor.endEditBlock()
+
+
+    def render_tail(self, cursor:QTextCursor, text:str) -> None:
+        cursor.setPosition(self.tail_start)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+
+        # Whatever the old tail left behind in the first block
+        if not self.tail_start:
+            cursor.setBlockFormat(QTextBlockFormat())
+            cursor.setBlockCharFormat(QTextCharFormat())
+
+        if text.strip():
+            cursor.insertFragment(fragment(text, not self.tail_start))
+
+
+    def finish(self) -> None:
+        """
+        Keep the rendering of a reply that has finished streaming in
+        """
+        if self.markdown and self.splitter and self.source:
+            render_cache.put(self.source, QTextDocumentFragment(self.document()))
+
+
+    def fit_height(self, size) -> None:
+        self.setFixedHeight(int(size.height()) + 2 * self.frameWidth())
+
+
+    def resizeEvent(self, event) -> None:
+        super().resizeEvent(event)
+        self.fit_height(self.document().size())
+
+
+class FirstPaint(QObject):
+    """
+    Calls callback the first time widget is painted
+    """
+
+    def __init__(self, widget, callback) -> None:
+        super().__init__()
+        self.callback = callback
+        widget.installEventFilter(self)
+
+
+    def eventFilter(self, watched, event) -> bool:
+        if event.type() == QEvent.Paint and self.callback:
+            callback = self.callback
+            self.callback = None
+            callback()
+
+        return False
 
 
 class MainWindow(QMainWindow, WindowMixin):
     """
     The window for conducting chats
     """
+    pinned_suffix = ' (pinned)'
 
     def __init__(self, *,
             settings     : Settings,
             conversation : Conversation,
-            models       : ModelNames) -> None:
+            models       : ModelNames,
+            warmer       : Optional[Warmer]=None) -> None:
 
         self.conversation = conversation
         self.settings = settings
+        self.warmer = warmer
 
         self.current_bubble_text = None
+        self.current_bubble_frame = None
 
         self.models = models
 
+        # Very long conversations are shown in a list view that only
+        # lays out the messages that are on screen
+        threshold = settings['virtual_view_threshold']
+        self.virtual_view = 0 < threshold <= len(conversation)
+        self.history_start = 0
+        self.history_ready = False
+        # A search result to go to once the history has its bubbles
+        self.position_wanted = None
+
         super().__init__()
         self.load_xml('main_window.ui')
 
         self.swap_widgets()
-        self.setup_remove_template_widgets()
+        if not self.virtual_view:
+            self.setup_remove_template_widgets()
 
         self.ask = Asker(
             q_message=self.message,
             conversation=conversation,
             context=settings['context'],
+            flush_interval=settings['flush_interval'],
+            flush_chars=settings['flush_chars'],
+            stable_prompt=settings['stable_prompt'],
+            context_window=ContextWindow(
+                settings['context_length'],
+                settings['context_reserve'],
+                settings['model_context_lengths']
+            ),
+            keep_alive=warmer.keep_alive if warmer else None,
+            engine=settings['engine'],
             client_wrapper=self.models,
             q_combo_models=self.combo_models
         )
 
         self.message.setFocus()
         self.setup_bindings()
+        if self.warmer:
+            self.warmer.warm(conversation.model_name)
 
-
-        for message in conversation.messages:
-            if message['role'] == 'user':
-                self.add_user_bubble(message['content'])
-            elif message['role'] == 'assistant':
-                self.add_assistant_bubble('AI', message['content'])
+        # Reading the messages waits until the window is on screen
+        if self.virtual_view:
+            self.setup_sending()
+        else:
+            self.send.setEnabled(False)
+            self.history_paint = FirstPaint(self, self.load_history)
 
 
     def swap_widgets(self):
@@ -99,11 +456,172 @@ class MainWindow(QMainWindow, WindowMixin):
             self.combo_models,
             ComboBoxModels(self.models, self.conversation.model_name)
         )
-        self.swap_widget_deep_clone(self.scrollArea, ScrollAreaChat())
+
+        if self.virtual_view:
+            self.swap_widget(self.scrollArea, ListViewChat(self.conversation))
+            self.setup_stop_button()
+        else:
+            self.swap_widget_deep_clone(self.scrollArea, ScrollAreaChat())
+
+
+    def setup_stop_button(self):
+        """
+        The list view has no bubble widgets to put a stop button in
+        """
+        self.btn_stop = QPushButton('Stop!')
+        self.btn_stop.setVisible(False)
+        self.btn_stop.clicked.connect(lambda: self.ask.stop())
+        self.horizontalLayout.addWidget(self.btn_stop)
+
+
+    def warm_up(self, model_name):
+        if self.warmer and self.combo_models.isEnabled():
+            self.warmer.warm(model_name)
+
+
+    def load_history(self):
+        """
+        Read the messages in the background, the window shows without
+        them until they are in
+        """
+        if self.conversation.loaded:
+            self.setup_history(self.settings['history_initial'])
+            return
+
+        self.history_thread = MessageLoadThread(self.conversation.loader)
+        self.history_thread.finished.connect(self.history_loaded)
+        self.history_thread.start()
+
+
+    def history_loaded(self):
+        # Unless something needed them first and read them itself
+        if not self.conversation.loaded and self.history_thread.messages is not None:
+            self.conversation.messages = self.history_thread.messages
+
+        self.setup_history(self.settings['history_initial'])
+
+
+    def setup_history(self, count):
+        """
+        Only the most recent messages get bubbles straight away,
+        older ones are added in chunks when the event loop is idle
+        or when the user scrolls to the top
+        """
+        if self.history_ready:
+            return
+
+        messages = self.conversation.messages
+        self.history_start = max(len(messages) - count, 0)
+
+        for message in messages[self.history_start:]:
+            self.add_message_bubble(message)
+
+        self.history_timer = QTimer(self)
+        self.history_timer.setInterval(0)
+        self.history_timer.timeout.connect(self.add_older_history)
+
+        if self.history_start:
+            self.scrollArea.keep_from_bottom = True
+            self.scrollArea.verticalScrollBar().valueChanged.connect(
+                self.history_scrolled
+            )
+            self.history_timer.start()
+
+        self.history_ready = True
+        self.setup_sending()
+        if self.position_wanted is not None:
+            self.show_message(self.position_wanted)
+            self.position_wanted = None
+
+
+    def setup_sending(self):
+        """
+        Only once the history has its bubbles, a message sent before then
+        would be in the history as well as get a bubble of its own
+        """
+        # ListViewChat binds to the conversation itself
+        if not self.virtual_view:
+            self.conversation.bind('add_word', self.word_add)
+            self.conversation.bind('add_user_message', self.add_user_bubble)
+
+        self.message.returnPressed.connect(self.ask)
+        self.send.clicked.connect(self.ask)
+        self.send.setEnabled(True)
+
+
+    def history_scrolled(self, value):
+        if value == self.scrollArea.verticalScrollBar().minimum():
+            self.add_older_history()
+
+
+    def add_older_history(self):
+        if not self.history_start:
+            return
+
+        start = max(self.history_start - self.settings['history_chunk'], 0)
+        older = self.conversation.messages[start:self.history_start]
+        self.history_start = start
+
+        for message in reversed(older):
+            self.add_message_bubble(message, 0)
+
+        if not self.history_start:
+            self.history_timer.stop()
+
+
+    def show_message(self, position):
+        """
+        Scroll to the message at position, adding older history until
+        it has a bubble
+        """
+        if self.virtual_view:
+            self.scrollArea.scrollTo(
+                self.scrollArea.model().index(position),
+                QAbstractItemView.PositionAtCenter
+            )
+            return
+
+        if not self.history_ready:
+            self.position_wanted = position
+            return
+
+        while self.history_start > position:
+            self.add_older_history()
+
+        layout = self.w['vertical_layout_conversation']
+        item = layout.itemAt(position - self.history_start)
+        if item and item.widget():
+            self.scrollArea.at_bottom = False
+            # Once the new bubbles have been laid out
+            QTimer.singleShot(0, lambda:
+                self.scrollArea.ensureWidgetVisible(item.widget())
+            )
+
+
+    def new_bubble_added(self, index):
+        # Once all of the history is in, new messages at the bottom can
+        # scroll the view again
+        if index == -1 and not self.history_start:
+            self.scrollArea.keep_from_bottom = False
+
+
+    def add_message_bubble(self, message, index=-1):
+        frame = None
+        if message['role'] == 'user':
+            frame = self.add_user_bubble(message['content'], index)
+        elif message['role'] == 'assistant':
+            frame = self.add_assistant_bubble('AI', message['content'], index)
+            if message.get('metrics', {}).get('cached'):
+                frame.set_cached()
+            if self.settings['show_metrics'] and 'metrics' in message:
+                frame.show_metrics(message['metrics'])
+
+        if frame and message.get('pinned'):
+            self.show_pinned(frame, True)
 
 
     def word_add(self, word):
-        self.current_bubble_text.setText(self.current_bubble_text.text() + word)
+        self.current_bubble_text.append_text(word)
 
 
     def setup_remove_template_widgets(self):
@@ -112,18 +630,27 @@ class MainWindow(QMainWindow, WindowMixin):
 
 
     def setup_bindings(self):
-        self.bind = Bindings(['new_window_request', 'settings_show_request'])
+        self.bind = Bindings([
+            'new_window_request',
+            'settings_show_request',
+            'search_show_request'
+        ])
 
         # fixme!
-        self.conversation.bind('add_word', self.word_add)
         self.conversation.bind(
             'assistant_typing',
             self.assistant_typing_toggled
         )
-        self.conversation.bind('add_user_message', self.add_user_bubble)
 
-        self.message.returnPressed.connect(self.ask)
-        self.send.clicked.connect(self.ask)
+        self.conversation.bind('context_trimmed', self.context_trimmed)
+        self.conversation.bind('queued', self.queued)
+        self.conversation.bind('word_error', self.word_error)
+
+        # Get the model loaded while the user is still typing
+        self.message.textEdited.connect(
+            lambda text: self.warm_up(self.combo_models.currentText())
+        )
+        self.combo_models.currentTextChanged.connect(self.warm_up)
 
         self.menu('action_configure', lambda:
             self.bind.trigger('settings_show_request')
@@ -132,6 +659,9 @@ class MainWindow(QMainWindow, WindowMixin):
         self.menu('action_new_window', lambda:
             self.bind.trigger('new_window_request')
         )
+        self.menu('action_search', lambda:
+            self.bind.trigger('search_show_request')
+        )
         self.menu('action_close_window', self.close)
         self.menu('action_quit', QApplication.quit)
 
@@ -151,7 +681,7 @@ Do you want to close the program?''',
             event.accept()
             QApplication.quit()
         elif result == QMessageBox.Discard:
-            self.conversation.mark_for_deletion = True
+            self.conversation.discard()
             event.accept()
         else:
             event.ignore()
@@ -159,44 +689,170 @@ Do you want to close the program?''',
 
     def settings_changed(self):
         self.ask.context = self.settings['context']
+        self.ask.flush_interval = self.settings['flush_interval']
+        self.ask.flush_chars = self.settings['flush_chars']
+        self.ask.stable_prompt = self.settings['stable_prompt']
+        self.ask.engine = self.settings['engine']
+        scheduler.max_in_flight = self.settings['max_parallel_requests']
+        self.settings.setup_response_cache()
+        self.ask.context_window.context_length = self.settings['context_length']
+        self.ask.context_window.reserve = self.settings['context_reserve']
+        self.ask.context_window.model_lengths = self.settings['model_context_lengths']
         #todo fixme!
 
 
+    def queued(self, position):
+        if self.virtual_view:
+            if position:
+                self.statusBar().showMessage('Queued #%d' % position)
+            else:
+                self.statusBar().clearMessage()
+        elif self.current_bubble_frame:
+            self.current_bubble_frame.set_queued(position)
+
+
+    def word_error(self, error):
+        if self.virtual_view:
+            self.statusBar().showMessage('No reply: %s' % error)
+        elif self.current_bubble_frame:
+            self.current_bubble_frame.show_error(error)
+
+
+    def context_trimmed(self, dropped):
+        messages, tokens = dropped
+        if messages:
+            self.statusBar().showMessage(
+                '%d older messages (~%d tokens) were not sent to fit the context'
+                    % (messages, tokens)
+            )
+        else:
+            self.statusBar().clearMessage()
+
+
     def assistant_typing_toggled(self, value):
-        if value:
+        if self.virtual_view:
+            self.btn_stop.setVisible(value)
+        elif value:
             self.add_assistant_bubble('AI')
         else:
             self.current_bubble_frame.done()
 
+        if not value and self.conversation.messages[-1].get('metrics', {}).get('cached'):
+            if self.virtual_view:
+                self.statusBar().showMessage('Answered from the cache')
+            else:
+                self.current_bubble_frame.set_cached()
+
+        if not value and self.settings['show_metrics']:
+            self.show_metrics(self.conversation.messages[-1].get('metrics'))
 
-    def add_assistant_bubble(self, title, message=None):
-        frame = FrameAssistant(title, message, self.ask.thread)
-        self.current_bubble_text = frame.current_bubble_text
-        self.current_bubble_frame = frame
 
-        self.w['vertical_layout_conversation'].addWidget(frame)
+    def show_metrics(self, metrics):
+        if not metrics:
+            return
+
+        if self.virtual_view:
+            self.statusBar().showMessage(describe(metrics))
+        else:
+            self.current_bubble_frame.show_metrics(metrics)
+
+
+    def add_assistant_bubble(self, title, message=None, index=-1):
+        frame = FrameAssistant(
+            title,
+            message,
+            self.ask.thread,
+            self.ask.stop,
+            self.settings['markdown']
+        )
+
+        # Older history is put in above, the current bubble is the last one
+        if index == -1:
+            self.current_bubble_text = frame.current_bubble_text
+            self.current_bubble_frame = frame
+
+        self.w['vertical_layout_conversation'].insertWidget(index, frame)
+        self.new_bubble_added(index)
+        self.setup_pin_menu(frame, frame.current_bubble_text)
         return frame
 
 
-    def add_user_bubble(self, message):
+    def add_user_bubble(self, message, index=-1):
         frame = self.clone_widget_into('frame_user', QFrame())
 
         frame.findChild(QLabel, 'author_user').setText(getpass.getuser())
         frame.findChild(QLabel, 'user_text').setText(message)
 
-        self.w['vertical_layout_conversation'].addWidget(frame)
+        self.w['vertical_layout_conversation'].insertWidget(index, frame)
+        self.new_bubble_added(index)
+        self.setup_pin_menu(frame)
         return frame
 
 
+    def setup_pin_menu(self, frame, text=None):
+        """
+        Right clicking a bubble pins or unpins its message, text is a
+        TextBubble that keeps its own menu with the pin added to it
+        """
+        frame.setContextMenuPolicy(Qt.CustomContextMenu)
+        frame.customContextMenuRequested.connect(lambda point:
+            self.pin_menu(frame, QMenu(self), frame.mapToGlobal(point))
+        )
+
+        if text:
+            text.setContextMenuPolicy(Qt.CustomContextMenu)
+            text.customContextMenuRequested.connect(lambda point:
+                self.pin_menu(
+                    frame,
+                    text.createStandardContextMenu(point),
+                    text.mapToGlobal(point)
+                )
+            )
+
+
+    def pin_menu(self, frame, menu, point):
+        messages = self.conversation.messages
+        index = self.w['vertical_layout_conversation'].indexOf(frame)
+        if index != -1:
+            index+= self.history_start
+
+        # The reply being typed isn't finished yet
+        typing = self.conversation.assistant_typing and index >= len(messages) - 1
+        if 0 <= index < len(messages) and not typing:
+            pinned = bool(messages[index].get('pinned'))
+            if not menu.isEmpty():
+                menu.addSeparator()
+            action = menu.addAction('Unpin' if pinned else 'Pin, always send it')
+        else:
+            action = None
+
+        if not menu.isEmpty() and menu.exec_(point) == action and action:
+            self.conversation.pin(index, not pinned)
+            self.show_pinned(frame, not pinned)
+
+
+    def show_pinned(self, frame, pinned):
+        label = (frame.findChild(QLabel, 'author_assistant')
+            or frame.findChild(QLabel, 'author_user'))
+        text = label.text().replace(self.pinned_suffix, '')
+        label.setText(text + self.pinned_suffix if pinned else text)
+
+
 class FrameAssistant(QFrame):
-    def __init__(self, title, message=None, queryThread=None):
+    def __init__(self, title, message=None, queryThread=None, stop_request=None,
+            markdown:bool=False):
         super().__init__()
         self.queryThread = queryThread
+        # Stopping a request that is still queued needs the Asker
+        self.stop_request = stop_request
+        self.markdown = markdown
 
         self.populate_widgets()
+        self.title = title
         self.findChild(QLabel, 'author_assistant').setText(title)
-        self.current_bubble_text = self.findChild(QLabel, 'assistant_text')
-        self.current_bubble_text.setText(message if message else '')
+        self.current_bubble_text = self.swap_text_bubble(
+            message if message else ''
+        )
 
         if message:
             self.done()
@@ -205,11 +861,23 @@ class FrameAssistant(QFrame):
 
 
     def populate_widgets(self):
-        class Mixin(QMainWindow, WindowMixin):
-            pass
-        mixin = Mixin()
-        mixin.load_xml('main_window.ui')
-        mixin.clone_widget_into('frame_assistant', self)
+        ui_templates.build(
+            ui_file_path('main_window.ui'),
+            'frame_assistant',
+            self
+        )
+
+
+    def swap_text_bubble(self, text:str) -> TextBubble:
+        label = self.findChild(QLabel, 'assistant_text')
+        bubble = TextBubble(text, self.markdown)
+        label.parentWidget().layout().replaceWidget(label, bubble)
+        label.hide()
+        label.deleteLater()
+        bubble.setObjectName('assistant_text')
+        self.assistant_text = bubble
+
+        return bubble
 
 
     def bind(self):
@@ -217,33 +885,162 @@ class FrameAssistant(QFrame):
 
 
     def stop(self):
-        self.queryThread.stop = True
+        if self.stop_request:
+            self.stop_request()
+        elif self.queryThread:
+            self.queryThread.stop = True
+
+
+    def set_queued(self, position):
+        if position:
+            text = '%s (queued #%d)' % (self.title, position)
+        else:
+            text = self.title
+        self.findChild(QLabel, 'author_assistant').setText(text)
+
+
+    def set_cached(self):
+        self.title = '%s (cached)' % self.title
+        self.findChild(QLabel, 'author_assistant').setText(self.title)
 
 
     def done(self):
         self.btn_stop.setParent(None)
         self.queryThread = None
+        self.current_bubble_text.finish()
+
+
+    def show_error(self, error):
+        self.findChild(QLabel, 'author_assistant').setText(
+            '%s (failed)' % self.title
+        )
+        label = QLabel(error)
+        label.setObjectName('assistant_error')
+        label.setWordWrap(True)
+        label.setStyleSheet('color: #FF9999')
+        self.verticalLayout_101.addWidget(label)
+
+
+    def show_metrics(self, metrics):
+        label = QLabel(describe(metrics))
+        label.setObjectName('assistant_metrics')
+        label.setStyleSheet('color: #BBBBCC; font-size: 8pt')
+        label.setToolTip('\n'.join(
+            '%s: %s' % (name, value) for name, value in sorted(metrics.items())
+        ))
+        self.verticalLayout_101.addWidget(label)
+
+
+class SearchDialog(QDialog, WindowMixin):
+    """
+    Searches the messages of every conversation as the user types,
+    open_request is triggered with the result that is picked
+    """
+
+    def __init__(self, search:SearchIndex):
+        super().__init__()
+        self.load_xml('search.ui')
+        self.search = search
+        self.results = []
+        self.setup_bindings()
+
+
+    def setup_bindings(self):
+        self.bind = Bindings(['open_request'])
+
+        self.line_edit_search.textChanged.connect(self.find)
+        self.list_results.itemActivated.connect(self.open)
+
+
+    def show(self):
+        super().show()
+        self.raise_()
+        self.activateWindow()
+        self.line_edit_search.setFocus()
+        self.line_edit_search.selectAll()
+
+
+    def find(self, text:str) -> None:
+        started = monotonic()
+        self.results = self.search.search(text)
+        took = monotonic() - started
+
+        self.list_results.clear()
+        for result in self.results:
+            label = QLabel(self.result_html(result))
+            item = QListWidgetItem()
+            item.setSizeHint(label.sizeHint())
+            self.list_results.addItem(item)
+            self.list_results.setItemWidget(item, label)
+
+        if text.strip():
+            self.label_status.setText(
+                '%d found in %.0fms' % (len(self.results), took * 1000)
+            )
+        else:
+            self.label_status.setText('')
+
+
+    def result_html(self, result:dict) -> str:
+        author = 'AI' if result['role'] == 'assistant' else getpass.getuser()
+        snippet = html.escape(result['snippet'].replace('\n', ' '))
+        snippet = snippet.replace(MATCH_START, '<b>').replace(MATCH_END, '</b>')
+        return '<i>%s</i>: %s' % (html.escape(author), snippet)
+
+
+    def open(self, item:QListWidgetItem) -> None:
+        self.bind.trigger('open_request', self.results[self.list_results.row(item)])
 
 
 class ComboBoxModels(QComboBox):
     unable_to_connect_text = 'Unable to connect!'
+    loading_text = 'Loading models...'
 
     def __init__(self, models, selected_model=None):
         self.models = models
+        self.selected_model = selected_model
         super().__init__()
         self.redraw(False, selected_model)
+        self.models.changed.connect(self.models_changed)
+
+
+    def models_changed(self):
+        if self.model_name():
+            self.selected_model = self.model_name()
+
+        self.redraw(True, self.selected_model)
+
+
+    def model_name(self) -> Optional[str]:
+        """
+        The model picked, None while the list is loading or couldn't be,
+        as the only item is then a message
+        """
+        if self.isEnabled() and self.currentText() in self.models:
+            return self.currentText()
+        return None
 
 
     def redraw(self, clear=True, selected_model=None):
         if clear:
             self.clear()
 
-        if self.models.last_exception:
+        if self.models.loading:
+            self.addItems([self.loading_text])
+            self.setEnabled(False)
+        elif self.models.last_exception:
             self.addItems([self.unable_to_connect_text])
             self.setEnabled(False)
         else:
-            self.addItems(self.models)
             self.setEnabled(True)
+            self.addItems(self.models)
+            if self.models.hosts:
+                for i, model_name in enumerate(self.models):
+                    self.setItemData(
+                        i,
+                        'On: ' + ', '.join(self.models.hosts_for(model_name)),
+                        Qt.ToolTipRole
+                    )
             if selected_model in self.models:
                 self.setCurrentIndex(self.models.index(selected_model))
 
@@ -253,13 +1050,22 @@ class SettingsDialog(QDialog, WindowMixin):
         super().__init__()
         self.load_xml('settings.ui')
         self.settings = settings
+
+        # One for the life of the dialog, each one listens to model_cache
+        self.models = ModelNames(None, False, settings['url'], settings['models_ttl'])
+        self.models.connecting = True
+        self.swap_widget(self.combo_models, ComboBoxModels(self.models))
         self.setup_bindings()
 
 
     def setup_data_state(self):
-        self.models = ModelNames(create_client(self.settings['url']), True)
+        url = self.settings['url']
+        self.models.ttl = self.settings['models_ttl']
+        self.models.set_client(create_client(url), url)
+        self.models.load()
+        self.combo_models.redraw(True, self.settings['model_name'])
+
         self.tabs.setCurrentIndex(0)
-        self.swap_widget(self.combo_models, ComboBoxModels(self.models))
 
         self.plain_text_context.setPlainText(self.settings['context'])
         self.line_edit_url.setText(self.settings['url'])
@@ -288,7 +1094,8 @@ class SettingsDialog(QDialog, WindowMixin):
 
 
     def connect(self):
-        self.models.client = create_client(self.line_edit_url.text())
+        url = self.line_edit_url.text()
+        self.models.set_client(create_client(url), url)
         self.models.reload()
         self.combo_models.redraw()
 
@@ -301,7 +1108,8 @@ class SettingsDialog(QDialog, WindowMixin):
         # Need to do this before overwriting values
         values_changed = self._check_values_changed()
 
-        self.settings['model_name'] = self.combo_models.currentText()
+        if self.combo_models.model_name():
+            self.settings['model_name'] = self.combo_models.model_name()
         self.settings['context'] = self.plain_text_context.toPlainText()
         self.settings['url'] = self.line_edit_url.text()
         self.settings['style'] = self.combo_styles.currentText()
@@ -321,7 +1129,8 @@ class SettingsDialog(QDialog, WindowMixin):
         if url_only:
             return False
 
-        if self.settings['model_name'] != self.combo_models.currentText():
+        model_name = self.combo_models.model_name()
+        if model_name and self.settings['model_name'] != model_name:
             return True
         if self.settings['context'] != self.plain_text_context.toPlainText():
             return True
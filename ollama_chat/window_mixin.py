@@ -25,7 +25,81 @@ from PyQt5.QtGui import *
 from PyQt5.QtCore import QObject
 from xml.etree import ElementTree as ET
 
-from pprint import pprint
+def ui_file_path(xml_file):
+    # If this file is moved this line will need to change
+    ui_dir = str(Path(__file__).resolve().parent.parent)
+    return os.path.join(ui_dir, 'ui', xml_file)
+
+
+class UiTemplates:
+    """
+    Process wide cache of widgets cut out of .ui files.
+    Each file is parsed once and each widget in it is compiled into a Python
+    Ui_ class the first time it is asked for, after that building a copy of
+    the widget is just a call to setupUi()
+    """
+
+    def __init__(self):
+        self.trees = {}
+        self.classes = {}
+
+
+    def tree(self, xml_file):
+        if xml_file not in self.trees:
+            self.trees[xml_file] = ET.parse(xml_file)
+
+        return self.trees[xml_file]
+
+
+    def fragment_class(self, xml_file, name):
+        key = (xml_file, name)
+        if key not in self.classes:
+            self.classes[key] = self._compile(xml_file, name)
+
+        return self.classes[key]
+
+
+    def _compile(self, xml_file, name):
+        item = self.tree(xml_file).find('.//widget[@name="%s"]' % name)
+
+        # Not found in the XML DOM?
+        if item is None:
+            return None
+
+        # Wrap the fragment in a <ui> tag so that it
+        # resembles a UI file in it's own right
+        wrapped_in_ui_tag = ('<ui version="4.0"><class>%s</class>%s</ui>' % (
+            name,
+            ET.tostring(item, encoding='unicode', method='xml')
+        ))
+
+        python_code = io.StringIO()
+        uic.compileUi(io.StringIO(wrapped_in_ui_tag), python_code)
+
+        namespace = {}
+        exec(python_code.getvalue(), namespace)
+        return namespace['Ui_' + name]
+
+
+    def build(self, xml_file, name, new_widget):
+        """
+        Build the widget called name from xml_file into new_widget,
+        child widgets are set as attributes on new_widget like uic.loadUi()
+        """
+        ui_class = self.fragment_class(xml_file, name)
+        if ui_class is None:
+            return None
+
+        ui = ui_class()
+        ui.setupUi(new_widget)
+        for attribute, child in vars(ui).items():
+            setattr(new_widget, attribute, child)
+
+        return new_widget
+
+
+ui_templates = UiTemplates()
+
 
 def load_web_engine_if_needed():
     return False
@@ -95,9 +169,7 @@ class WindowMixin:
 
 
     def load_xml(self, xml_file, web_engine_widget=False):
-        # If this file is moved this line will need to change
-        ui_dir = str(Path(__file__).resolve().parent.parent)
-        self.xml_file = os.path.join(ui_dir, 'ui', xml_file)
+        self.xml_file = ui_file_path(xml_file)
 
         if load_web_engine_if_needed():
             fd, tmp_path = tempfile.mkstemp()
@@ -137,7 +209,7 @@ class WindowMixin:
     @property
     def xml_root(self):
         if not self.xml_root_:
-            self.xml_root_ = ET.parse(self.xml_file)
+            self.xml_root_ = ui_templates.tree(self.xml_file)
 
         return self.xml_root_
 
@@ -151,32 +223,8 @@ class WindowMixin:
             name = original
         else:
             name = original.objectName()
-        item = self.xml_root.find('.//widget[@name="%s"]' % name)
 
-        # Not found in the XML DOM?
-        if item == None:
-            return None
-
-        # Get the DOM fragment for the original node as an XML string
-        xml_for_clone = str(
-            ET.tostring(item, encoding='utf8', method='xml')
-        ).replace('\\n', '\n')
-
-        # Strip the XML doctype fromt he top
-        without_doctype = xml_for_clone.split('>', 1)[1].replace("'", '')
-
-        # Wrap the fragment in a <ui> tag so that it
-        # resembles a UI file in it's own right
-        # Also add in a blank <class> tag as sometimes it breaks without it
-        wrapped_in_ui_tag = ('<ui version="4.0"><class/>'
-            + without_doctype + '</ui>'
-        )
-
-        # new_widget will have the temport XML loaded into it
-        # as if new_widget was a window
-        uic.loadUi(io.StringIO(wrapped_in_ui_tag), new_widget)
-
-        return new_widget
+        return ui_templates.build(self.xml_file, name, new_widget)
 
 
     def get_widget_parent_layout_from_ui(self, widget):
@@ -0,0 +1,36 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import sys
+from os.path import dirname, abspath
+
+# The tests import ollama_chat from the checkout
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+import pytest
+from types import SimpleNamespace
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    """
+    Stands in for AppDirs so storage tests keep their files in tmp_path
+    """
+    return SimpleNamespace(
+        user_config_dir=str(tmp_path / 'config'),
+        user_data_dir=str(tmp_path / 'data')
+    )
@@ -0,0 +1,112 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os, time
+import pytest
+from ollama_chat import archive
+from ollama_chat.conversation import Conversation
+from ollama_chat.state import JsonStorage
+
+DATA = {
+    'model_name': 'mock:latest',
+    'messages': [{'role': 'user', 'content': 'Hello ünïcode ' * 50}]
+}
+
+
+@pytest.mark.parametrize('compression', [
+    'gzip',
+    pytest.param('zstd', marks=pytest.mark.skipif(
+        archive.zstandard is None,
+        reason='zstandard is not installed'
+    ))
+])
+def test_archive_round_trip(tmp_path, compression):
+    file_path = str(tmp_path / ('a.json' + archive.SUFFIXES[compression]))
+    archive.write_archive(file_path, DATA, compression)
+
+    assert archive.read_archive(file_path) == DATA
+    assert os.path.getsize(file_path) < len(str(DATA))
+    # Nothing is left behind by the atomic write
+    assert os.listdir(tmp_path) == [os.path.basename(file_path)]
+
+
+def test_zstd_falls_back_to_gzip_without_zstandard(monkeypatch):
+    monkeypatch.setattr(archive, 'zstandard', None)
+    assert archive.compression_to_use('zstd') == 'gzip'
+
+
+def saved_conversation(dirs, days_old:float):
+    storage = JsonStorage(dirs=dirs)
+    storage.fsync_interval = 0
+    con = Conversation(messages=list(DATA['messages']), model_name='mock:latest')
+    storage.attach_journal(con)
+    storage.save_all_conversations([con])
+
+    modified = time.time() - days_old * 24 * 60 * 60
+    os.utime(storage.snapshot_path(con.name), (modified, modified))
+    return con
+
+
+def cold_storage(dirs) -> JsonStorage:
+    storage = JsonStorage(dirs=dirs)
+    storage.fsync_interval = 0
+    storage.setup_archive(30, 'gzip')
+    return storage
+
+
+def test_cold_snapshots_are_archived_and_still_load(dirs):
+    con = saved_conversation(dirs, 31)
+    storage = cold_storage(dirs)
+
+    with storage.snapshot_lock:
+        assert storage.archive_if_cold(con.name)
+
+    assert not os.path.exists(storage.snapshot_path(con.name))
+    assert storage.archive_path(con.name).endswith('.gz')
+    assert storage.conversation_names() == [con.name]
+    assert storage.load_conversation(con.name)['messages'] == DATA['messages']
+
+
+def test_recent_snapshots_are_not_archived(dirs):
+    con = saved_conversation(dirs, 29)
+    storage = cold_storage(dirs)
+
+    with storage.snapshot_lock:
+        assert not storage.archive_if_cold(con.name)
+    assert storage.archive_path(con.name) is None
+
+
+def test_a_changed_conversation_goes_back_to_plain_json(dirs):
+    con = saved_conversation(dirs, 31)
+    storage = cold_storage(dirs)
+    with storage.snapshot_lock:
+        storage.archive_if_cold(con.name)
+
+    storage.load_index()
+    con = Conversation(
+        messages=None,
+        model_name='mock:latest',
+        name=con.name,
+        loader=lambda: storage.load_conversation(con.name)['messages'],
+        count=1
+    )
+    storage.attach_journal(con)
+    con.add_user_message('Back again')
+    storage.save_all_conversations([con])
+
+    assert storage.archive_path(con.name) is None
+    assert len(storage.load_conversation(con.name)['messages']) == 2
@@ -0,0 +1,56 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio, threading
+from ollama_chat.clients import ClientRegistry
+
+
+def test_the_same_client_is_shared_per_url():
+    registry = ClientRegistry()
+    client = registry.get('http://127.0.0.1:1')
+    assert registry.get('http://127.0.0.1:1') is client
+    assert registry.get('http://127.0.0.1:2') is not client
+
+
+def test_a_client_in_use_is_closed_after_its_request():
+    registry = ClientRegistry()
+    client = registry.get('http://127.0.0.1:1')
+    with registry.using(client):
+        registry.retire_except('http://127.0.0.1:2')
+        assert not client._client.is_closed
+
+    assert client._client.is_closed
+    assert registry.get('http://127.0.0.1:1') is not client
+
+
+def test_async_clients_are_retired_and_closed_on_their_loop():
+    registry = ClientRegistry()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        client = registry.get_async('http://127.0.0.1:1', loop)
+        assert registry.get_async('http://127.0.0.1:1', loop) is client
+
+        registry.configure(registry.max_connections + 1, registry.max_keepalive)
+        # Once the close scheduled on the loop has run
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop).result(5)
+        assert client._client.is_closed
+        assert registry.get_async('http://127.0.0.1:1', loop) is not client
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
@@ -0,0 +1,67 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from ollama_chat.context_window import ContextWindow
+
+
+def conversation(count:int) -> list:
+    # 100 characters is 29 tokens with the per-message overhead
+    return [
+        {'role': 'user' if i % 2 == 0 else 'assistant', 'content': 'x' * 100}
+        for i in range(count)
+    ]
+
+
+def test_everything_is_sent_when_it_fits():
+    window = ContextWindow(1000, 0)
+    messages = conversation(10)
+    assert len(window.select(messages)) == 10
+    assert window.dropped_messages == 0
+
+
+def test_jumps_forward_to_low_water_and_stays_put():
+    window = ContextWindow(1000, 0)
+    messages = conversation(40)
+    window.select(messages)
+    start = window.start
+    assert (40 - start) * 29 <= 1000 * window.low_water
+    assert window.dropped_messages == start
+
+    # The next turn starts at the same message
+    messages+= conversation(2)
+    window.select(messages)
+    assert window.start == start
+
+
+def test_moves_back_when_the_budget_grows():
+    window = ContextWindow(1000, 0, {'big': 4000})
+    messages = conversation(40)
+    window.select(messages, 'small')
+    assert window.start > 0
+
+    assert len(window.select(messages, 'big')) == 40
+    assert window.start == 0 and window.dropped_messages == 0
+
+
+def test_pinned_messages_are_always_sent():
+    window = ContextWindow(1000, 0)
+    messages = conversation(40)
+    messages[0]['pinned'] = True
+    sent = window.select(messages)
+    assert window.start > 1
+    assert sent[0] == {'role': 'user', 'content': 'x' * 100}
+    assert window.dropped_messages == window.start - 1
@@ -0,0 +1,130 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json, os
+from ollama_chat.conversation import Conversation
+from ollama_chat.state import JsonStorage, Journal, write_file_atomic
+
+
+def storage(dirs) -> JsonStorage:
+    storage = JsonStorage(dirs=dirs)
+    storage.fsync_interval = 0
+    return storage
+
+
+def crashed(dirs, *contents) -> Conversation:
+    """
+    A conversation only in its journal, the program never saved it
+    """
+    con = Conversation(messages=[], model_name='mock:latest')
+    storage(dirs).attach_journal(con)
+    for content in contents:
+        con.add_user_message(content)
+    return con
+
+
+def test_replay_puts_records_in_place():
+    data = {'model_name': 'old', 'messages': [{'role': 'user', 'content': 'One'}]}
+    Journal.replay([
+        {'model_name': 'new'},
+        # Already in the snapshot
+        {'i': 0, 'role': 'user', 'content': 'One'},
+        {'i': 1, 'role': 'assistant', 'content': 'Two'},
+        {'i': 1, 'role': 'assistant', 'content': 'Two', 'pinned': True}
+    ], data)
+
+    assert data == {'model_name': 'new', 'messages': [
+        {'role': 'user', 'content': 'One'},
+        {'role': 'assistant', 'content': 'Two', 'pinned': True}
+    ]}
+
+
+def test_a_crashed_conversation_is_loaded_from_its_journal(dirs):
+    con = crashed(dirs, 'One', 'Two')
+
+    data = storage(dirs).load_conversation(con.name)
+    assert data['model_name'] == 'mock:latest'
+    assert data['messages'] == con.messages
+
+
+def test_a_truncated_last_record_is_skipped(dirs):
+    con = crashed(dirs, 'One', 'Two')
+    journal_path = storage(dirs).journal_path(con.name)
+    with open(journal_path, 'a') as file:
+        file.write('{"i": 2, "role": "user", "cont')
+
+    assert Journal(journal_path).records == 3
+    assert storage(dirs).load_conversation(con.name)['messages'] == con.messages
+
+
+def test_snapshot_and_journal_are_combined(dirs):
+    store = storage(dirs)
+    con = Conversation(messages=[], model_name='mock:latest')
+    store.attach_journal(con)
+    con.add_user_message('One')
+    store.compact(con).join()
+    con.add_user_message('Two')
+
+    assert os.path.exists(store.snapshot_path(con.name))
+    # Only the message the snapshot doesn't have is left
+    records = Journal.read(store.journal_path(con.name))
+    assert [r['i'] for r in records if 'i' in r] == [1]
+    assert storage(dirs).load_conversation(con.name)['messages'] == con.messages
+
+
+def test_write_file_atomic_replaces_without_leaving_files(tmp_path):
+    file_path = str(tmp_path / 'a' / 'snapshot.json')
+    write_file_atomic(file_path, 'old')
+    write_file_atomic(file_path, 'new')
+
+    assert open(file_path).read() == 'new'
+    assert os.listdir(tmp_path / 'a') == ['snapshot.json']
+
+
+def test_index_is_rebuilt_when_it_is_missing_or_corrupt(dirs):
+    con = crashed(dirs, 'One', 'Two')
+    store = storage(dirs)
+    expected = {con.name: {
+        'model_name': 'mock:latest',
+        'count': 2,
+        'journal_records': 3,
+        'files': store.file_stats(con.name)
+    }}
+
+    assert store.load_index() == expected
+    assert json.load(open(store.index_path)) == expected
+
+    with open(store.index_path, 'w') as file:
+        file.write('{"truncated')
+    assert storage(dirs).load_index() == expected
+
+
+def test_index_catches_up_with_changed_and_removed_files(dirs):
+    kept = crashed(dirs, 'One')
+    removed = crashed(dirs, 'Bye')
+    store = storage(dirs)
+    store.load_index()
+
+    # Changed by another instance
+    other = storage(dirs)
+    other.attach_journal(kept)
+    kept.add_user_message('Two')
+    os.remove(store.journal_path(removed.name))
+
+    index = storage(dirs).load_index()
+    assert list(index) == [kept.name]
+    assert index[kept.name]['count'] == 2
@@ -0,0 +1,79 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from ollama_chat.markdown import BlockSplitter
+
+
+def split(*chunks) -> tuple:
+    """
+    The finished blocks and the open tail after feeding chunks in order
+    """
+    splitter = BlockSplitter()
+    finished = []
+    for chunk in chunks:
+        finished.extend(splitter.feed(chunk))
+    return finished, splitter.tail
+
+
+def test_paragraphs_end_at_the_next_block():
+    finished, tail = split('One\n\nTwo\n', '\nThree\n')
+    assert finished == ['One\n\n', 'Two\n\n']
+    assert tail == 'Three\n'
+
+
+def test_only_whole_lines_are_read():
+    finished, tail = split('One\n\nTh')
+    assert finished == []
+    assert tail == 'One\n\nTh'
+
+
+def test_a_blank_line_alone_does_not_end_a_block():
+    # The next line could still carry it on
+    finished, tail = split('One\n\n')
+    assert finished == []
+    assert tail == 'One\n\n'
+
+
+def test_blocks_split_the_same_however_the_text_arrives():
+    text = 'Intro\n\n- a\n\n- b\n\nOutro\n\n```\ncode\n\nmore\n```\nEnd\n'
+    whole = split(text)
+    assert split(*text) == whole
+    assert split(text[:7], text[7:20], text[20:]) == whole
+
+
+def test_code_fences_are_one_block_blank_lines_and_all():
+    finished, tail = split('```python\nx = 1\n\n\ny = 2\n```\nAfter\n')
+    assert finished == ['```python\nx = 1\n\n\ny = 2\n```\n']
+    assert tail == 'After\n'
+
+
+def test_a_fence_only_closes_with_the_same_marks():
+    finished, tail = split('~~~~\n```\nstill code\n~~~~\n')
+    assert finished == ['~~~~\n```\nstill code\n~~~~\n']
+    assert tail == ''
+
+
+def test_list_items_after_a_blank_line_stay_in_the_list():
+    finished, tail = split('- one\n\n- two\n\n1. three\n\nAfter\n')
+    assert finished == ['- one\n\n- two\n\n1. three\n\n']
+    assert tail == 'After\n'
+
+
+def test_indented_lines_carry_on_the_block():
+    finished, tail = split('- item\n\n    more of the item\n\nAfter\n')
+    assert finished == ['- item\n\n    more of the item\n\n']
+    assert tail == 'After\n'
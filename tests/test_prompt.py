@@ -0,0 +1,68 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+from datetime import datetime
+from ollama_chat.prompt import build_messages, is_volatile
+
+
+def turns(stable:bool) -> list:
+    """
+    The messages sent for three turns of a conversation, a few minutes apart
+    """
+    history = []
+    sent = []
+    for turn, minute in enumerate((1, 7, 42)):
+        history.append({'role': 'user', 'content': 'Question %d' % turn})
+        sent.append(build_messages(
+            list(history),
+            'Be brief',
+            stable,
+            datetime(2025, 3, 14, 9, minute),
+            'alice'
+        ))
+        history.append({'role': 'assistant', 'content': 'Answer %d' % turn})
+
+    return sent
+
+
+def prefix(messages:list) -> str:
+    """
+    The JSON of messages without the time line at the end or the closing ]
+    """
+    return json.dumps(messages[:-1])[:-1]
+
+
+def test_stable_prefix_is_kept_between_turns():
+    sent = turns(True)
+    for before, after in zip(sent, sent[1:]):
+        assert json.dumps(after).startswith(prefix(before))
+
+
+def test_unstable_prefix_changes_between_turns():
+    sent = turns(False)
+    for before, after in zip(sent, sent[1:]):
+        assert not json.dumps(after).startswith(prefix(before))
+
+
+def test_stable_time_goes_after_the_history():
+    messages = turns(True)[-1]
+    assert is_volatile(messages[-1])
+    assert messages[-1]['content'] == "The current time is '09:42'"
+    assert [m for m in messages[:-1] if is_volatile(m)] == [
+        {'role': 'system', 'content': "The current date is '2025-03-14'"}
+    ]
@@ -0,0 +1,120 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import pytest
+from datetime import datetime
+from ollama_chat.prompt import build_messages
+from ollama_chat.response_cache import ResponseCache, response_cache, cache_key
+from ollama_chat.batch import BatchJob
+
+
+def query(messages:list, now:datetime, model:str='mock:latest') -> dict:
+    return {
+        'model': model,
+        'messages': build_messages(messages, 'Be brief', True, now, 'alice'),
+        'stream': True
+    }
+
+
+@pytest.fixture
+def cache():
+    response_cache.configure(True, 8)
+    response_cache.entries.clear()
+    yield response_cache
+    response_cache.configure(False)
+    response_cache.entries.clear()
+
+
+def test_key_ignores_the_date_and_time():
+    messages = [{'role': 'user', 'content': 'Hello'}]
+    assert (cache_key(query(messages, datetime(2025, 3, 14, 9, 1)))
+        == cache_key(query(messages, datetime(2025, 6, 1, 18, 30))))
+
+
+def test_key_changes_with_the_messages_and_model():
+    now = datetime(2025, 3, 14, 9, 1)
+    key = cache_key(query([{'role': 'user', 'content': 'Hello'}], now))
+    assert key != cache_key(query([{'role': 'user', 'content': 'Hi'}], now))
+    assert key != cache_key(query(
+        [{'role': 'user', 'content': 'Hello'}],
+        now,
+        'other:latest'
+    ))
+
+
+def test_least_recently_used_is_evicted():
+    cache = ResponseCache()
+    cache.configure(True, 2)
+    cache.put('a', {'content': 'A'})
+    cache.put('b', {'content': 'B'})
+    cache.get('a')
+    cache.put('c', {'content': 'C'})
+
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.get('b') is None
+
+
+def test_evicted_entries_are_read_back_from_disk(tmp_path):
+    cache = ResponseCache()
+    cache.configure(True, 1, str(tmp_path))
+    cache.put('a', {'content': 'A'})
+    cache.put('b', {'content': 'B'})
+
+    assert 'a' not in cache.entries
+    assert cache.get('a') == {'content': 'A'}
+
+
+def test_disk_is_trimmed_to_max_bytes(tmp_path):
+    cache = ResponseCache()
+    cache.configure(True, 1, str(tmp_path), 3000)
+    for i in range(5):
+        cache.put('k%d' % i, {'content': 'x' * 1000})
+
+    assert sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)) <= 3000
+    assert (tmp_path / 'k4.json').exists()
+
+
+def job() -> BatchJob:
+    job = BatchJob({}, [{'role': 'user', 'content': 'Hello'}], None, 'mock:latest')
+    job.cache_key = 'key'
+    job.reply = []
+    return job
+
+
+def part(content:str, done:bool=False) -> dict:
+    return {'message': {'content': content}, 'done': done}
+
+
+def test_only_a_complete_reply_is_cached(cache):
+    unfinished = job()
+    unfinished.collect(part('Hel'))
+    unfinished.collect(part('lo'))
+    assert cache.get('key') is None
+
+    finished = job()
+    finished.collect(part('Hel'))
+    finished.collect(part('lo', True))
+    assert cache.get('key')['content'] == 'Hello'
+
+
+def test_a_stopped_reply_is_not_cached(cache):
+    stopped = job()
+    stopped.collect(part('Hel'))
+    stopped.stop = True
+    stopped.collect(part('lo', True))
+    assert cache.get('key') is None
@@ -0,0 +1,90 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from ollama_chat.scheduler import Scheduler, PRIORITY_FOCUSED, PRIORITY_NORMAL
+
+
+class Signal:
+    def __init__(self) -> None:
+        self.slots = []
+
+
+    def connect(self, slot) -> None:
+        self.slots.append(slot)
+
+
+    def emit(self, *args) -> None:
+        for slot in self.slots:
+            slot(*args)
+
+
+class Job:
+    def __init__(self, name:str, started:list) -> None:
+        self.name = name
+        self.started = started
+        self.finished = Signal()
+        self.queued = Signal()
+
+
+    def start(self) -> None:
+        self.started.append(self.name)
+
+
+def test_jobs_wait_for_a_free_slot_in_order():
+    started = []
+    scheduler = Scheduler(1)
+    jobs = [Job(name, started) for name in 'abc']
+    for job in jobs:
+        scheduler.submit(job, 'url')
+
+    assert started == ['a']
+    assert scheduler.position(jobs[2]) == 2
+    jobs[0].finished.emit()
+    jobs[1].finished.emit()
+    assert started == ['a', 'b', 'c']
+
+
+def test_priority_is_asked_when_the_next_job_is_picked():
+    started = []
+    scheduler = Scheduler(1)
+    focused = {'b': False, 'c': False}
+
+    def priority(name):
+        return lambda: PRIORITY_FOCUSED if focused[name] else PRIORITY_NORMAL
+
+    first = Job('a', started)
+    scheduler.submit(first, 'url')
+    for name in 'bc':
+        scheduler.submit(Job(name, started), 'url', priority(name))
+
+    # The focus moves to c's window while both are waiting
+    focused['c'] = True
+    first.finished.emit()
+    assert started == ['a', 'c']
+
+
+def test_cancel_takes_a_job_out_of_the_queue():
+    started = []
+    scheduler = Scheduler(1)
+    first, second = Job('a', started), Job('b', started)
+    scheduler.submit(first, 'url')
+    scheduler.submit(second, 'url')
+
+    assert scheduler.cancel(second)
+    assert not scheduler.cancel(first)
+    first.finished.emit()
+    assert started == ['a']
@@ -0,0 +1,124 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from ollama_chat.search import SearchIndex, match_query, MATCH_START, MATCH_END
+
+
+class Storage:
+    """
+    Conversations in memory, stamp changes as they are edited
+    """
+
+    def __init__(self) -> None:
+        self.conversations = {}
+        self.stamps = {}
+        self.loaded = []
+
+
+    def put(self, name:str, *contents) -> None:
+        self.conversations[name] = [
+            {'role': 'user', 'content': content} for content in contents
+        ]
+        self.stamps[name] = self.stamps.get(name, 0) + 1
+
+
+    def conversation_names(self) -> list:
+        return list(self.conversations)
+
+
+    def stamp(self, name:str):
+        return [self.stamps[name]]
+
+
+    def load_conversation(self, name:str) -> dict:
+        self.loaded.append(name)
+        return {'name': name, 'messages': self.conversations[name]}
+
+
+def names(index:SearchIndex, text:str) -> list:
+    return sorted(result['conversation'] for result in index.search(text))
+
+
+def test_rebuild_indexes_only_what_changed(tmp_path):
+    storage = Storage()
+    storage.put('a', 'the quick brown fox')
+    storage.put('b', 'jumps over the lazy dog')
+    index = SearchIndex(str(tmp_path / 'search.db'))
+
+    assert index.rebuild(storage) == 2
+    assert names(index, 'fox') == ['a']
+
+    storage.loaded = []
+    assert index.rebuild(storage) == 0
+    assert storage.loaded == []
+
+    storage.put('b', 'a sleepy fox')
+    assert index.rebuild(storage) == 1
+    assert storage.loaded == ['b']
+    assert names(index, 'fox') == ['a', 'b']
+    assert names(index, 'lazy') == []
+    index.close()
+
+
+def test_rebuild_forgets_removed_conversations(tmp_path):
+    storage = Storage()
+    storage.put('a', 'the quick brown fox')
+    index = SearchIndex(str(tmp_path / 'search.db'))
+    index.rebuild(storage)
+
+    del storage.conversations['a']
+    index.rebuild(storage)
+    assert index.indexed() == {}
+    assert names(index, 'fox') == []
+    index.close()
+
+
+def test_saved_conversations_are_not_indexed_again(tmp_path):
+    storage = Storage()
+    storage.put('a', 'the quick brown fox')
+    index = SearchIndex(str(tmp_path / 'search.db'))
+    index.rebuild(storage)
+
+    # Added as it was written, then saved by the program itself
+    storage.put('a', 'the quick brown fox', 'a new message')
+    index.add('a', 1, storage.conversations['a'][1])
+    index.saved('a', storage.stamp('a'))
+
+    assert index.rebuild(storage) == 0
+    assert names(index, 'new') == ['a']
+    index.close()
+
+
+def test_index_conversation_drops_messages_that_are_gone(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search.db'))
+    index.index_conversation('a', [
+        {'role': 'user', 'content': 'first fox'},
+        {'role': 'assistant', 'content': 'second fox'}
+    ], [1])
+    index.index_conversation('a', [{'role': 'user', 'content': 'first fox'}], [2])
+
+    results = index.search('fox')
+    assert [(r['position'], r['role']) for r in results] == [(0, 'user')]
+    assert MATCH_START + 'fox' + MATCH_END in results[0]['snippet']
+    index.close()
+
+
+def test_match_query_quotes_words_and_matches_prefixes():
+    assert match_query('') is None
+    assert match_query('"; DROP') == '"DROP"*'
+    assert match_query('brown fo') == '"brown" "fo"'
+    assert match_query('brown fox') == '"brown" "fox"*'
@@ -0,0 +1,122 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from ollama_chat.conversation import Conversation
+from ollama_chat.state import JsonStorage
+from ollama_chat.sqlite_storage import SqliteStorage, migrate
+
+
+def conversation(name:str, *contents) -> Conversation:
+    return Conversation(
+        messages=[{'role': 'user', 'content': c} for c in contents],
+        model_name='mock:latest',
+        name=name
+    )
+
+
+def storage(dirs) -> SqliteStorage:
+    storage = SqliteStorage(dirs=dirs)
+    # Flushed by hand rather than by the background thread
+    storage.fsync_interval = 60
+    return storage
+
+
+def test_recorded_messages_are_written_by_flush(dirs):
+    writer = storage(dirs)
+    con = conversation('a')
+    writer.attach_journal(con)
+    con.add_user_message('Hello')
+    con.add_user_message('Again')
+
+    reader = storage(dirs)
+    assert reader.load_conversation('a') is None
+
+    writer.flush()
+    assert reader.load_conversation('a')['messages'] == con.messages
+    assert reader.load_index() == {'a': {'model_name': 'mock:latest', 'count': 2}}
+
+
+def test_stamp_changes_with_every_write(dirs):
+    store = storage(dirs)
+    con = conversation('a')
+    store.attach_journal(con)
+    con.add_user_message('Hello')
+    store.flush()
+    stamp = store.stamp('a')
+
+    con.add_user_message('Again')
+    store.flush()
+    assert store.stamp('a') != stamp
+    assert store.stamp('gone') is None
+
+
+def test_save_all_writes_what_was_not_recorded(dirs):
+    store = storage(dirs)
+    recorded = conversation('recorded')
+    store.attach_journal(recorded)
+    recorded.add_user_message('Hello')
+
+    # Not attached, so nothing was recorded as it happened
+    unrecorded = conversation('unrecorded', 'One', 'Two')
+    discarded = conversation('discarded', 'Bye')
+    store.import_conversation('discarded', dict(discarded))
+    discarded.mark_for_deletion = True
+
+    store.save_all_conversations([recorded, unrecorded, discarded])
+
+    reader = storage(dirs)
+    assert reader.conversation_names() == ['recorded', 'unrecorded']
+    assert reader.load_conversation('recorded')['messages'] == recorded.messages
+    assert reader.load_conversation('unrecorded')['messages'] == unrecorded.messages
+
+
+def test_save_all_leaves_conversations_that_were_never_loaded(dirs):
+    store = storage(dirs)
+    store.import_conversation('a', dict(conversation('a', 'One', 'Two')))
+    stamp = store.stamp('a')
+
+    lazy = Conversation(
+        messages=None,
+        model_name='mock:latest',
+        name='a',
+        loader=lambda: [],
+        count=2
+    )
+    store.save_all_conversations([lazy])
+
+    assert not lazy.loaded
+    assert store.stamp('a') == stamp
+    assert len(store.load_conversation('a')['messages']) == 2
+
+
+def test_migrate_copies_the_json_conversations(dirs):
+    source = JsonStorage(dirs=dirs)
+    source.fsync_interval = 0
+    saved = conversation('saved', 'One')
+    source.attach_journal(saved)
+    source.save_all_conversations([saved])
+
+    # Only in the journal, as if the program had crashed
+    crashed = conversation('crashed')
+    source.attach_journal(crashed)
+    crashed.add_user_message('Lost?')
+
+    target = storage(dirs)
+    assert migrate(source, target) == 2
+    assert target.get_meta('migrated')
+    assert target.load_conversation('saved')['messages'] == saved.messages
+    assert target.load_conversation('crashed')['messages'] == crashed.messages
@@ -0,0 +1,82 @@
+"""
+    Database Dossier - A User Interface for your databases
+    Copyright (C) 2025  Nicholas Shiell
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import time
+import pytest
+from PyQt5.QtCore import QCoreApplication
+from benchmarks.mock_server import MockOllama
+from ollama_chat.model import QueryThread
+from ollama_chat.engine import AsyncQueryJob
+from ollama_chat.clients import clients
+
+# Stopping has to close the connection rather than wait for the next chunk
+STOP_WITHIN = 0.5
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def wait_for(app, condition, timeout:float=10) -> float:
+    started = time.monotonic()
+    while not condition():
+        if time.monotonic() - started > timeout:
+            raise TimeoutError()
+        app.processEvents()
+        time.sleep(0.001)
+
+    return time.monotonic() - started
+
+
+def start(job_class, mock:MockOllama):
+    job = job_class(
+        [{'role': 'user', 'content': 'Hello'}],
+        clients.get(mock.url),
+        'mock:latest',
+        flush_interval=0,
+        url=mock.url
+    )
+    job.words = []
+    job.done = False
+    job.word.connect(job.words.append)
+    job.finished.connect(lambda: setattr(job, 'done', True))
+    job.start()
+    return job
+
+
+@pytest.mark.parametrize('job_class', [QueryThread, AsyncQueryJob])
+def test_stop_while_streaming(app, job_class):
+    with MockOllama(tokens=100000, tokens_per_second=200) as mock:
+        job = start(job_class, mock)
+        wait_for(app, lambda: job.words)
+
+        job.stop = True
+        assert wait_for(app, lambda: job.done) < STOP_WITHIN
+        # The server sees the connection go
+        wait_for(app, lambda: mock.disconnects == 1, 5)
+
+
+@pytest.mark.parametrize('job_class', [QueryThread, AsyncQueryJob])
+def test_stop_before_the_first_token(app, job_class):
+    with MockOllama(first_token_delay=3) as mock:
+        job = start(job_class, mock)
+        time.sleep(0.2)
+
+        job.stop = True
+        assert wait_for(app, lambda: job.done) < STOP_WITHIN
+        assert not job.words